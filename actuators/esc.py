@@ -0,0 +1,190 @@
+# actuators/esc.py
+
+import threading
+import time
+
+class ESC:
+    # Throttle for a motor speed controller on the same PWM backend as the servos.
+    # Throttle is a percentage, 0 to 100 (or -100 to 100 when reversible), sent as
+    # a pulse between min_us and max_us. The ESC thread runs the arming sequence,
+    # ramps throttle increases at ramp_rate and falls back to neutral when neither
+    # a command nor a keepalive arrives within timeout. Small changes are
+    # written straight from the caller's thread (the fast path); set_throttle
+    # never blocks on the ramp. A reversal always ramps through neutral.
+    def __init__(self, backend, pin=13, channel="throttle", min_us=1000, max_us=2000, reversible=False,
+                 ramp_rate=50.0, timeout=1.0, arm_time=2.0, calibrate=False, rate_hz=50.0):
+        self.backend = backend
+        self.channel = channel
+        self.min_us = min_us
+        self.max_us = max_us
+        self.reversible = reversible
+        self.neutral_us = (min_us + max_us) / 2 if reversible else min_us
+        self.ramp_rate = ramp_rate          # percent per second, throttle increases only
+        self.timeout = timeout              # seconds without a command or keepalive before the failsafe
+        self.arm_time = arm_time            # seconds of neutral pulse the ESC needs to arm
+        self.calibrate = calibrate          # teach the ESC the pulse range before arming
+        self.period = 1.0 / rate_hz
+        self.backend.add_channel(channel, pin)
+
+        self.condition = threading.Condition()
+        self.armed = False
+        self.running = False
+        self.thread = None
+        self.throttle = 0.0                 # percent currently sent
+        self.target = 0.0                   # percent requested
+        self.last_command = None            # time.monotonic() of the last set_throttle or keepalive
+        self.pending_since = None           # command time not yet reflected in the pulse
+
+        # Statistics
+        self.commands = 0
+        self.fast_path = 0
+        self.failsafes = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.latency_count = 0
+
+    def pulse_width(self, throttle):
+        if self.reversible:
+            return self.neutral_us + throttle / 100.0 * (self.max_us - self.neutral_us)
+        return self.min_us + throttle / 100.0 * (self.max_us - self.min_us)
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="esc", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.backend.set_pulse_width(self.channel, self.neutral_us)
+
+    def set_throttle(self, throttle):
+        low = -100.0 if self.reversible else 0.0
+        throttle = max(low, min(100.0, float(throttle)))
+        now = time.monotonic()
+        with self.condition:
+            self.commands += 1
+            self.target = throttle
+            self.last_command = now
+            if not self.armed:
+                return
+            step = self.ramp_rate * self.period
+            same_direction = throttle * self.throttle >= 0
+            if (same_direction and abs(throttle) <= abs(self.throttle)) or abs(throttle - self.throttle) <= step:
+                # Fast path: reductions and changes within one ramp step go out at once
+                self._write(throttle, now)
+                self.fast_path += 1
+            else:
+                self.pending_since = now
+            self.condition.notify()
+
+    def keepalive(self, now=None):
+        # Any frame from the ground station: a steady throttle stays on, as
+        # the operator sends no command while holding the stick still
+        if now is None:
+            now = time.monotonic()
+        with self.condition:
+            if self.last_command is not None:
+                self.last_command = max(self.last_command, now)
+
+    def _write(self, throttle, command_time=None):
+        self.backend.set_pulse_width(self.channel, self.pulse_width(throttle))
+        self.throttle = throttle
+        if command_time is not None:
+            latency = time.monotonic() - command_time
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+            self.latency_count += 1
+
+    def _arm(self):
+        # Optional range calibration (full then zero throttle), then neutral until armed
+        if self.calibrate:
+            self.backend.set_pulse_width(self.channel, self.max_us)
+            time.sleep(self.arm_time)
+            self.backend.set_pulse_width(self.channel, self.min_us)
+            time.sleep(self.arm_time)
+        self.backend.set_pulse_width(self.channel, self.neutral_us)
+        time.sleep(self.arm_time)
+        with self.condition:
+            self.armed = True
+            self.target = 0.0  # commands sent while arming are not replayed
+        print("ESC armed")
+
+    def _run(self):
+        self._arm()
+        while True:
+            with self.condition:
+                if not self.running:
+                    break
+                now = time.monotonic()
+                if self.last_command is not None and now - self.last_command > self.timeout and \
+                        (self.target != 0.0 or self.throttle != 0.0):
+                    # Failsafe: command link silent, back to neutral
+                    self.failsafes += 1
+                    self.target = 0.0
+                    self._write(0.0)
+                    print("ESC failsafe: ground station silent, back to neutral")
+
+                if self.throttle != self.target:
+                    step = self.ramp_rate * self.period
+                    change = max(-step, min(step, self.target - self.throttle))
+                    reached = abs(self.target - self.throttle) <= step
+                    self._write(self.target if reached else self.throttle + change,
+                                self.pending_since)
+                    self.pending_since = None
+                    timeout = self.period
+                elif self.last_command is not None and self.throttle != 0.0:
+                    timeout = self.last_command + self.timeout - now
+                else:
+                    timeout = None
+                self.condition.wait(timeout)
+
+    def get_stats(self):
+        # Command to pulse latency in seconds
+        return {
+            "armed": self.armed,
+            "throttle": self.throttle,
+            "commands": self.commands,
+            "fast_path": self.fast_path,
+            "failsafes": self.failsafes,
+            "latency_mean": self.latency_total / self.latency_count if self.latency_count else 0.0,
+            "latency_max": self.latency_max,
+        }
+
+if __name__ == '__main__':
+    # Latency from set_throttle to the pulse change on a simulated backend
+    import random
+    from actuators.pwm_backends import FakePwmBackend
+    backend = FakePwmBackend()
+    esc = ESC(backend, arm_time=0.2, timeout=2.0)
+    esc.start()
+    while not esc.armed:
+        time.sleep(0.01)
+
+    latencies = []
+    for _ in range(200):
+        throttle = max(0.0, min(100.0, esc.throttle + random.uniform(-2.0, 2.0)))
+        count = len(backend.history)
+        start = time.monotonic()
+        esc.set_throttle(throttle)
+        while len(backend.history) == count:
+            time.sleep(0)
+        latencies.append(backend.history[-1][0] - start)
+        time.sleep(0.01)
+    latencies.sort()
+    print(f"small steps: median {latencies[len(latencies) // 2] * 1e6:.0f} us, "
+          f"max {latencies[-1] * 1e6:.0f} us, fast path {esc.fast_path}/{esc.commands}")
+
+    start = time.monotonic()
+    esc.set_throttle(80.0)
+    while esc.throttle < 80.0:
+        time.sleep(0.001)
+    print(f"ramp 0 -> 80%: {time.monotonic() - start:.2f} s at {esc.ramp_rate:.0f}%/s")
+    time.sleep(esc.timeout + 0.2)
+    print(f"after {esc.timeout} s of silence: throttle {esc.throttle}%, failsafes {esc.failsafes}")
+    esc.stop()
+    print(esc.get_stats())
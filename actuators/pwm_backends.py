@@ -0,0 +1,279 @@
+# actuators/pwm_backends.py
+
+import os
+import threading
+import time
+from abc import abstractmethod, ABCMeta
+
+SERVO_FREQUENCY = 50            # Hz, one pulse every 20 ms
+SERVO_PERIOD_US = 1000000 // SERVO_FREQUENCY
+
+class ServoCalibration:
+    # Maps an angle to a pulse width in microseconds for one servo. The default
+    # matches the old duty cycle formula, 2 + angle / 18 percent of 20 ms.
+    def __init__(self, min_us=400, max_us=2400, min_angle=0.0, max_angle=180.0, trim_us=0, reverse=False):
+        self.min_us = min_us
+        self.max_us = max_us
+        self.min_angle = min_angle
+        self.max_angle = max_angle
+        self.trim_us = trim_us
+        self.reverse = reverse
+
+    def pulse_width(self, angle):
+        fraction = (angle - self.min_angle) / (self.max_angle - self.min_angle)
+        if self.reverse:
+            fraction = 1.0 - fraction
+        width = self.min_us + fraction * (self.max_us - self.min_us) + self.trim_us
+        return max(min(self.min_us, self.max_us), min(max(self.min_us, self.max_us), width))
+
+class PwmBackend(metaclass=ABCMeta):
+    # Interface of the servo pulse generators. Channels are named ('rudder', 'sail')
+    # and pulse widths are microseconds; a width of 0 switches the output off.
+    hardware_timed = False      # pulses do not depend on CPU scheduling
+
+    def check_pins(self, pins):
+        # Raises ValueError if the backend cannot drive all of these pins at once
+        pass
+
+    @abstractmethod
+    def add_channel(self, channel, pin):
+        pass
+
+    @abstractmethod
+    def set_pulse_width(self, channel, width_us):
+        pass
+
+    def close(self):
+        pass
+
+class RPiGPIOBackend(PwmBackend):
+    # Software PWM from RPi.GPIO; works on any pin, but pulses jitter with CPU load
+    def __init__(self):
+        import RPi.GPIO as GPIO
+        self.GPIO = GPIO
+        GPIO.setmode(GPIO.BCM)
+        self.pins = {}
+        self.pwms = {}
+
+    def add_channel(self, channel, pin):
+        self.GPIO.setup(pin, self.GPIO.OUT)
+        pwm = self.GPIO.PWM(pin, SERVO_FREQUENCY)
+        pwm.start(0)
+        self.pins[channel] = pin
+        self.pwms[channel] = pwm
+
+    def set_pulse_width(self, channel, width_us):
+        self.pwms[channel].ChangeDutyCycle(100.0 * width_us / SERVO_PERIOD_US)
+
+    def close(self):
+        for pwm in self.pwms.values():
+            pwm.stop()
+        self.GPIO.cleanup(list(self.pins.values()))
+
+class PigpioBackend(PwmBackend):
+    # Servo pulses timed by the pigpio daemon's DMA engine, on any pin. pigpio
+    # only accepts 0 (off) or 500 to 2500 us, so widths are clamped to that range.
+    hardware_timed = True
+    MIN_PULSE_US = 500
+    MAX_PULSE_US = 2500
+
+    def __init__(self, pi=None):
+        import pigpio
+        self.pi = pi if pi is not None else pigpio.pi()
+        if not self.pi.connected:
+            raise OSError("pigpio daemon not running")
+        self.pins = {}
+
+    def add_channel(self, channel, pin):
+        self.pins[channel] = pin
+
+    def set_pulse_width(self, channel, width_us):
+        if width_us:
+            width_us = max(self.MIN_PULSE_US, min(self.MAX_PULSE_US, width_us))
+        self.pi.set_servo_pulsewidth(self.pins[channel], int(round(width_us)))
+
+    def close(self):
+        for pin in self.pins.values():
+            self.pi.set_servo_pulsewidth(pin, 0)
+        self.pi.stop()
+
+class SysfsPwmBackend(PwmBackend):
+    # Kernel hardware PWM (dtoverlay=pwm-2chan). Only the PWM pins can be used:
+    # GPIO 12/18 are channel 0 and GPIO 13/19 channel 1, and each hardware
+    # channel can drive only one output.
+    hardware_timed = True
+    PWM_CHANNELS = {12: 0, 18: 0, 13: 1, 19: 1}
+
+    def __init__(self, chip='/sys/class/pwm/pwmchip0'):
+        if not os.path.isdir(chip):
+            raise OSError(f"{chip} not found, is the pwm overlay enabled?")
+        self.chip = chip
+        self.paths = {}
+
+    def _write(self, path, value):
+        with open(path, 'w') as file:
+            file.write(str(value))
+
+    def check_pins(self, pins):
+        # At most two outputs on different channels, e.g. rudder_pin 13 and
+        # sail_pin 18, which leaves no output for the ESC
+        channels = {}
+        for pin in pins:
+            if pin not in self.PWM_CHANNELS:
+                raise ValueError(f"GPIO {pin} has no hardware PWM; the sysfs backend only drives "
+                                 f"GPIO 12/18 (channel 0) and 13/19 (channel 1)")
+            if self.PWM_CHANNELS[pin] in channels:
+                raise ValueError(f"GPIO {pin} and GPIO {channels[self.PWM_CHANNELS[pin]]} share hardware PWM "
+                                 f"channel {self.PWM_CHANNELS[pin]}; the sysfs backend drives at most two outputs")
+            channels[self.PWM_CHANNELS[pin]] = pin
+
+    def add_channel(self, channel, pin):
+        if pin not in self.PWM_CHANNELS:
+            raise ValueError(f"GPIO {pin} has no hardware PWM")
+        path = os.path.join(self.chip, f"pwm{self.PWM_CHANNELS[pin]}")
+        for other, used in self.paths.items():
+            if used == path:
+                raise ValueError(f"GPIO {pin} shares hardware PWM channel {self.PWM_CHANNELS[pin]} with '{other}'")
+        if not os.path.isdir(path):
+            self._write(os.path.join(self.chip, 'export'), self.PWM_CHANNELS[pin])
+        self._write(os.path.join(path, 'period'), SERVO_PERIOD_US * 1000)
+        self._write(os.path.join(path, 'duty_cycle'), 0)
+        self._write(os.path.join(path, 'enable'), 1)
+        self.paths[channel] = path
+
+    def set_pulse_width(self, channel, width_us):
+        self._write(os.path.join(self.paths[channel], 'duty_cycle'), int(round(width_us * 1000)))
+
+    def close(self):
+        for path in self.paths.values():
+            self._write(os.path.join(path, 'duty_cycle'), 0)
+            self._write(os.path.join(path, 'enable'), 0)
+
+class FakePwmBackend(PwmBackend):
+    # Records every pulse width change; for tests and machines without GPIO
+    hardware_timed = True
+
+    def __init__(self):
+        self.pins = {}
+        self.widths = {}
+        self.history = []       # (time.monotonic(), channel, width_us)
+        self.lock = threading.Lock()
+
+    def add_channel(self, channel, pin):
+        self.pins[channel] = pin
+        self.widths[channel] = 0
+
+    def set_pulse_width(self, channel, width_us):
+        with self.lock:
+            self.widths[channel] = width_us
+            self.history.append((time.monotonic(), channel, width_us))
+
+def make_pwm_backend(name='auto'):
+    # 'auto' prefers DMA-timed pigpio and falls back to RPi.GPIO software PWM
+    if name == 'pigpio':
+        return PigpioBackend()
+    if name == 'sysfs':
+        return SysfsPwmBackend()
+    if name == 'rpi_gpio':
+        return RPiGPIOBackend()
+    if name == 'fake':
+        return FakePwmBackend()
+    if name != 'auto':
+        raise ValueError(f"Unknown PWM backend: {name}")
+    try:
+        return PigpioBackend()
+    except (ImportError, OSError, AttributeError) as e:
+        print(f"pigpio unavailable ({e}), using RPi.GPIO software PWM")
+        return RPiGPIOBackend()
+
+def measure_pulse_error(pi, pin, expected_us, duration=2.0):
+    # Times the pulses on an output pin with pigpio's sampled edge ticks, whatever
+    # backend drives it. Returns statistics of width minus expected_us, in microseconds.
+    import pigpio
+    rise = {}
+    errors = []
+
+    def edge(gpio, level, tick):
+        if level == 1:
+            rise['tick'] = tick
+        elif level == 0 and 'tick' in rise:
+            errors.append(pigpio.tickDiff(rise.pop('tick'), tick) - expected_us)
+
+    callback = pi.callback(pin, pigpio.EITHER_EDGE, edge)
+    time.sleep(duration)
+    callback.cancel()
+    return pulse_error_stats(errors)
+
+def pulse_error_stats(errors):
+    if not errors:
+        return {"pulses": 0, "mean": 0.0, "std": 0.0, "max_abs": 0.0}
+    mean = sum(errors) / len(errors)
+    return {
+        "pulses": len(errors),
+        "mean": mean,
+        "std": (sum((error - mean) ** 2 for error in errors) / len(errors)) ** 0.5,
+        "max_abs": max(abs(error) for error in errors),
+    }
+
+def _busy(stop_time):
+    while time.time() < stop_time:
+        pass
+
+def _software_pulse_errors(expected_us, duration):
+    # Wakeup error of a pulse timed with sleep(), as software PWM experiences it
+    errors = []
+    stop = time.monotonic() + duration
+    while time.monotonic() < stop:
+        start = time.perf_counter()
+        time.sleep(expected_us / 1e6)
+        errors.append((time.perf_counter() - start) * 1e6 - expected_us)
+        time.sleep((SERVO_PERIOD_US - expected_us) / 1e6)
+    return pulse_error_stats(errors)
+
+if __name__ == '__main__':
+    # Pulse timing with and without a synthetic CPU load on every core. With the
+    # pigpio daemon running the real pulses of each backend are measured; without
+    # it only the software timing baseline can be measured.
+    import multiprocessing
+    pin, expected, duration = 18, 1500, 3.0
+
+    try:
+        import pigpio
+        pi = pigpio.pi()
+        if not pi.connected:
+            raise OSError("pigpio daemon not running")
+        tests = ['pigpio', 'sysfs', 'rpi_gpio']
+    except (ImportError, OSError) as e:
+        print(f"Cannot measure real pulses ({e}), measuring software timing only")
+        pi = None
+        tests = ['software timing']
+
+    for name in tests:
+        for loaded in (False, True):
+            workers = []
+            if loaded:
+                stop_time = time.time() + duration + 1.0
+                workers = [multiprocessing.Process(target=_busy, args=(stop_time,))
+                           for _ in range(multiprocessing.cpu_count())]
+                for worker in workers:
+                    worker.start()
+            try:
+                if pi is None:
+                    stats = _software_pulse_errors(expected, duration)
+                else:
+                    backend = make_pwm_backend(name)
+                    backend.add_channel('test', pin)
+                    backend.set_pulse_width('test', expected)
+                    time.sleep(0.2)
+                    stats = measure_pulse_error(pi, pin, expected, duration)
+                    backend.close()
+            except (ImportError, OSError, ValueError, RuntimeError) as e:
+                stats = None
+                print(f"{name}: unavailable ({e})")
+            for worker in workers:
+                worker.terminate()
+            if stats is not None:
+                print(f"{name:15s} {'loaded' if loaded else 'idle':6s}: {stats['pulses']} pulses, "
+                      f"error mean {stats['mean']:7.1f} us, std {stats['std']:6.1f} us, max {stats['max_abs']:7.1f} us")
+            if stats is None:
+                break
@@ -1,46 +1,179 @@
 # servos.py
 
-import RPi.GPIO as GPIO
+import threading
 import time
+from actuators.pwm_backends import ServoCalibration, make_pwm_backend
+from actuators.trajectory import TrajectoryEngine
+
+class ActuatorScheduler:
+    # Applies servo setpoints on its own thread. Each channel has a single
+    # pending slot, so a new setpoint replaces one that has not been applied yet.
+    # With a hold_time the pulse is released after that long without blocking
+    # anyone; None keeps the pulse on so the servo holds its position.
+    def __init__(self, backend, hold_time=None):
+        self.backend = backend  # PwmBackend
+        self.hold_time = hold_time
+        self.pending = {}       # channel name -> (pulse width in us, command time)
+        self.release_at = {}    # channel name -> time the pulse is released
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+
+        # Statistics
+        self.applied = 0
+        self.replaced = 0
+        self.write_errors = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.latency_last = 0.0
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="actuator-scheduler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def submit(self, channel, width_us):
+        with self.condition:
+            if channel in self.pending:
+                self.replaced += 1  # Latest value wins
+            self.pending[channel] = (width_us, time.monotonic())
+            self.condition.notify()
+
+    def get_stats(self):
+        # Command-to-actuation latency in seconds
+        return {
+            "applied": self.applied,
+            "replaced": self.replaced,
+            "write_errors": self.write_errors,
+            "latency_mean": self.latency_total / self.applied if self.applied else 0.0,
+            "latency_max": self.latency_max,
+            "latency_last": self.latency_last,
+        }
+
+    def _write(self, channel, width_us):
+        # A failed write is reported and the thread keeps serving the other channels
+        try:
+            self.backend.set_pulse_width(channel, width_us)
+        except Exception as e:
+            self.write_errors += 1
+            print(f"Error setting {channel} pulse to {width_us} us: {e}")
+
+    def _next_release_timeout(self):
+        if not self.release_at:
+            return None
+        return min(self.release_at.values()) - time.monotonic()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.running and not self.pending:
+                    timeout = self._next_release_timeout()
+                    if timeout is not None and timeout <= 0:
+                        break
+                    self.condition.wait(timeout)
+                if not self.running:
+                    break
+                work, self.pending = self.pending, {}
+
+            now = time.monotonic()
+            for channel, (width_us, command_time) in work.items():
+                self._write(channel, width_us)
+                latency = time.monotonic() - command_time
+                self.applied += 1
+                self.latency_total += latency
+                self.latency_max = max(self.latency_max, latency)
+                self.latency_last = latency
+                if self.hold_time is not None:
+                    self.release_at[channel] = now + self.hold_time
+
+            for channel, deadline in list(self.release_at.items()):
+                if deadline <= now:
+                    self._write(channel, 0)  # Release the pulse
+                    del self.release_at[channel]
 
 class Servos:
-    def __init__(self, rudder_pin=16, sail_pin=18):
+    def __init__(self, rudder_pin=16, sail_pin=18, hold_time=None, backend=None, calibration=None, limits=None):
         # Servo initiation for rudder and sail
         self.rudder_pin = rudder_pin  # GPIO pin for rudder servo
         self.sail_pin = sail_pin      # GPIO pin for sail servo
 
-        # Set up GPIO mode
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setup(self.rudder_pin, GPIO.OUT)
-        GPIO.setup(self.sail_pin, GPIO.OUT)
+        # Pulse generator, hardware timed when available (see pwm_backends)
+        self.backend = backend if backend is not None else make_pwm_backend()
+        self.backend.add_channel("rudder", self.rudder_pin)
+        self.backend.add_channel("sail", self.sail_pin)
+
+        # Angle to pulse width per servo
+        self.calibration = {"rudder": ServoCalibration(), "sail": ServoCalibration()}
+        self.calibration.update(calibration or {})
 
-        # Set up PWM for both servos (50Hz frequency)
-        self.rudder_pwm = GPIO.PWM(self.rudder_pin, 50)
-        self.sail_pwm = GPIO.PWM(self.sail_pin, 50)
+        # Software PWM buzzes while holding, so its pulse is released after a move;
+        # hardware-timed pulses stay on and keep holding torque
+        if hold_time is None and not self.backend.hardware_timed:
+            hold_time = 0.5
 
-        # Start PWM with 0% duty cycle (off)
-        self.rudder_pwm.start(0)
-        self.sail_pwm.start(0)
+        # Last commanded angles
+        self.rudder_angle = None
+        self.sail_angle = None
 
-    def move_servo(self, pwm, angle):
-        duty_cycle = 2 + (angle / 18)  # Convert angle to duty cycle (0-180 degrees)
-        pwm.ChangeDutyCycle(duty_cycle)
-        time.sleep(0.5)  # Adjust time as needed
-        pwm.ChangeDutyCycle(0)
+        # Setpoints are applied on a separate thread so callers never block. With
+        # limits ({channel: {"max_rate": deg/s, "max_accel": deg/s^2}}) the servos
+        # are slewed by the trajectory engine, otherwise they jump to the setpoint.
+        self.scheduler = None
+        self.trajectory = None
+        if limits:
+            self.trajectory = TrajectoryEngine(self.backend, hold_time=hold_time)
+            for channel in ("rudder", "sail"):
+                self.trajectory.add_channel(channel, self.calibration[channel], **limits.get(channel, {}))
+            self.trajectory.start()
+        else:
+            self.scheduler = ActuatorScheduler(self.backend, hold_time)
+            self.scheduler.start()
+
+    def move_servo(self, channel, angle):
+        if self.trajectory is not None:
+            self.trajectory.set_target(channel, angle)
+        else:
+            self.scheduler.submit(channel, self.calibration[channel].pulse_width(angle))
+
+    def get_arrival_time(self, channel):
+        # Seconds until the servo reaches its last setpoint, as far as the limits predict
+        if self.trajectory is not None:
+            return self.trajectory.predicted_arrival(channel)
+        return 0.0
 
     def set_rudder_angle(self, angle):
         if 0 <= angle <= 180:
-            self.move_servo(self.rudder_pwm, angle)
+            self.move_servo("rudder", angle)
+            self.rudder_angle = angle
         else:
             print("Invalid rudder angle. Must be between 0 and 180.")
 
     def set_sail_angle(self, angle):
         if 0 <= angle <= 90:  # Assuming sail angle is limited to 90 degrees
-            self.move_servo(self.sail_pwm, angle)
+            self.move_servo("sail", angle)
+            self.sail_angle = angle
         else:
             print("Invalid sail angle. Must be between 0 and 90.")
 
+    def get_angles(self):
+        return self.rudder_angle, self.sail_angle
+
+    def get_latency_stats(self):
+        if self.trajectory is not None:
+            return self.trajectory.get_stats()
+        return self.scheduler.get_stats()
+
     def cleanup(self):
-        self.rudder_pwm.stop()
-        self.sail_pwm.stop()
-        GPIO.cleanup()
+        if self.trajectory is not None:
+            self.trajectory.stop()
+        else:
+            self.scheduler.stop()
+        self.backend.close()
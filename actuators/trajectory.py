@@ -0,0 +1,212 @@
+# actuators/trajectory.py
+
+import math
+import threading
+import time
+from collections import deque
+import numpy as np
+
+LUT_STEPS_PER_DEGREE = 10   # angle resolution of the pulse lookup table
+
+def arrival_time(distance, speed, max_rate, max_accel):
+    # Time to cover distance (>= 0) and stop, starting at speed (positive towards
+    # the target), with a trapezoidal velocity profile
+    if speed < 0:
+        # Moving away: stop first, then come back from rest
+        return -speed / max_accel + arrival_time(distance + speed * speed / (2 * max_accel), 0.0,
+                                                 max_rate, max_accel)
+    if speed * speed / (2 * max_accel) >= distance:
+        return speed / max_accel    # already braking
+    peak = math.sqrt(max_accel * distance + speed * speed / 2)
+    if peak <= max_rate:
+        return (peak - speed) / max_accel + peak / max_accel
+    accelerating = (max_rate * max_rate - speed * speed) / (2 * max_accel)
+    braking = max_rate * max_rate / (2 * max_accel)
+    return (max_rate - speed) / max_accel + (distance - accelerating - braking) / max_rate + max_rate / max_accel
+
+class ServoTrajectory:
+    # Position, speed and limits of one servo channel
+    def __init__(self, calibration, max_rate=120.0, max_accel=600.0):
+        self.max_rate = max_rate        # degrees per second
+        self.max_accel = max_accel      # degrees per second squared
+        self.position = None            # unknown until the first target
+        self.speed = 0.0
+        self.target = None
+        self.pulse = None               # last pulse width sent
+        self.release_at = None
+        # Pulse width for every 0.1 degree over the calibrated range
+        self.min_angle = min(calibration.min_angle, calibration.max_angle)
+        max_angle = max(calibration.min_angle, calibration.max_angle)
+        angles = np.arange(self.min_angle, max_angle + 1e-9, 1.0 / LUT_STEPS_PER_DEGREE)
+        self.lut = np.array([calibration.pulse_width(angle) for angle in angles])
+
+    def pulse_width(self, angle):
+        index = int(round((angle - self.min_angle) * LUT_STEPS_PER_DEGREE))
+        return float(self.lut[max(0, min(len(self.lut) - 1, index))])
+
+    def moving(self):
+        return self.target is not None and (self.position != self.target or self.speed != 0.0)
+
+    def step(self, dt):
+        error = self.target - self.position
+        direction = 1.0 if error > 0 else -1.0
+        # Fastest speed from which the servo can still stop at the target
+        desired = direction * min(self.max_rate, math.sqrt(2 * self.max_accel * abs(error)))
+        change = max(-self.max_accel * dt, min(self.max_accel * dt, desired - self.speed))
+        self.speed += change
+        self.position += self.speed * dt
+        remaining = self.target - self.position
+        if remaining * error <= 0 or (abs(remaining) < 0.05 and abs(self.speed) <= self.max_accel * dt):
+            self.position = self.target
+            self.speed = 0.0
+
+    def time_to_target(self):
+        if not self.moving():
+            return 0.0
+        error = self.target - self.position
+        toward = self.speed if error >= 0 else -self.speed
+        return arrival_time(abs(error), toward, self.max_rate, self.max_accel)
+
+class TrajectoryEngine:
+    # Moves servos towards their targets at the PWM frame rate, within per-channel
+    # speed and acceleration limits, so the servos never jump and draw current
+    # spikes. The loop sleeps while every servo is at its target.
+    def __init__(self, backend, rate_hz=50.0, hold_time=None):
+        self.backend = backend
+        self.period = 1.0 / rate_hz
+        self.hold_time = hold_time      # release the pulse this long after arriving, None holds
+        self.channels = {}              # channel name -> ServoTrajectory
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+
+        # Statistics
+        self.steps = 0
+        self.overruns = 0
+        self.write_errors = 0
+        self.jitter = deque(maxlen=1000)
+        self.latency_last = 0.0         # command to first pulse change
+        self.command_time = {}
+
+    def add_channel(self, channel, calibration, max_rate=120.0, max_accel=600.0):
+        self.channels[channel] = ServoTrajectory(calibration, max_rate, max_accel)
+
+    def set_target(self, channel, angle):
+        with self.condition:
+            trajectory = self.channels[channel]
+            if trajectory.position is None:
+                trajectory.position = angle  # first command: the servo's position is unknown
+                trajectory.pulse = None
+            trajectory.target = angle
+            trajectory.release_at = None
+            self.command_time[channel] = time.monotonic()
+            self.condition.notify()
+
+    def predicted_arrival(self, channel):
+        # Seconds until the channel reaches its current target
+        with self.condition:
+            return self.channels[channel].time_to_target()
+
+    def get_position(self, channel):
+        return self.channels[channel].position
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="servo-trajectory", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def get_stats(self):
+        jitter = sorted(self.jitter)
+        return {
+            "steps": self.steps,
+            "overruns": self.overruns,
+            "write_errors": self.write_errors,
+            "jitter_p99": jitter[int(len(jitter) * 0.99)] if jitter else 0.0,
+            "jitter_max": jitter[-1] if jitter else 0.0,
+            "latency_last": self.latency_last,
+        }
+
+    def _write(self, channel, width_us):
+        # A failed write is reported and the loop keeps running
+        try:
+            self.backend.set_pulse_width(channel, width_us)
+        except Exception as e:
+            self.write_errors += 1
+            print(f"Error setting {channel} pulse to {width_us} us: {e}")
+
+    def _update(self, now):
+        # One frame: advance every channel and send the pulses that changed
+        busy = False
+        for channel, trajectory in self.channels.items():
+            if trajectory.target is None:
+                continue
+            if trajectory.moving():
+                trajectory.step(self.period)
+                busy = True
+            pulse = trajectory.pulse_width(trajectory.position)
+            if pulse != trajectory.pulse:
+                self._write(channel, pulse)
+                trajectory.pulse = pulse
+                if channel in self.command_time:
+                    self.latency_last = now - self.command_time.pop(channel)
+                if not trajectory.moving() and self.hold_time is not None:
+                    trajectory.release_at = now + self.hold_time
+            if trajectory.release_at is not None:
+                if trajectory.release_at <= now:
+                    self._write(channel, 0)
+                    trajectory.release_at = None
+                else:
+                    busy = True
+        return busy
+
+    def _run(self):
+        deadline = time.monotonic()
+        while True:
+            with self.condition:
+                if not self.running:
+                    break
+                now = time.monotonic()
+                self.jitter.append(max(0.0, now - deadline))
+                busy = self._update(now)
+                self.steps += 1
+                if not busy:
+                    # Everything at rest: sleep until the next command
+                    self.condition.wait()
+                    deadline = time.monotonic()
+                    continue
+            deadline += self.period
+            now = time.monotonic()
+            if now > deadline:
+                self.overruns += 1
+                deadline = now
+            time.sleep(deadline - now)
+
+if __name__ == '__main__':
+    # Move a simulated rudder and compare the predicted arrival time with the actual one
+    from actuators.pwm_backends import FakePwmBackend, ServoCalibration
+    backend = FakePwmBackend()
+    backend.add_channel("rudder", 16)
+    engine = TrajectoryEngine(backend)
+    engine.add_channel("rudder", ServoCalibration(), max_rate=90.0, max_accel=300.0)
+    engine.start()
+    engine.set_target("rudder", 90.0)
+    time.sleep(0.1)
+    for target in (135.0, 55.0, 60.0):
+        start = time.monotonic()
+        engine.set_target("rudder", target)
+        predicted = engine.predicted_arrival("rudder")
+        while engine.predicted_arrival("rudder") > 0:
+            time.sleep(0.005)
+        print(f"to {target:5.1f} deg: predicted {predicted:.3f} s, took {time.monotonic() - start:.3f} s")
+    engine.stop()
+    widths = [width for _, _, width in backend.history]
+    print(f"{len(widths)} pulse updates, largest step {max(abs(b - a) for a, b in zip(widths, widths[1:])):.1f} us, "
+          f"{engine.get_stats()}")
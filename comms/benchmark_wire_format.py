@@ -0,0 +1,54 @@
+# comms/benchmark_wire_format.py
+# Compares the binary wire format against JSON: bytes per message and
+# encode/decode time. Run from the repository root:
+#     python -m comms.benchmark_wire_format
+
+import json
+import time
+from comms.wire_format import MessageCodec, FORMAT_BINARY
+
+ITERATIONS = 20000
+
+SAMPLE_MESSAGES = {
+    "heartbeat": {"type": "heartbeat"},
+    "location_update": {"type": "location_update",
+                        "location": {"latitude": 37.8651234, "longitude": -122.3145678}},
+    "telemetry": {"type": "telemetry",
+                  "location": {"latitude": 37.8651234, "longitude": -122.3145678},
+                  "heading": 271.35,
+                  "servos": {"rudder_angle": 92.5, "sail_angle": 45.0},
+                  "health": {"command_mode": "manual", "uptime": 3600}},
+    "manual": {"command_mode": "manual", "rudder_angle": 92.5, "sail_angle": 45.0, "throttle": 30.0},
+    "autonomous": {"command_mode": "autonomous",
+                   "target_gps_latitude": 37.8661234, "target_gps_longitude": -122.3155678},
+}
+
+def encode_json(boat_name, message):
+    return json.dumps({"boat_name": boat_name, **message}).encode()
+
+def time_per_call(function, argument):
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        function(argument)
+    return (time.perf_counter() - start) / ITERATIONS * 1e6
+
+def main():
+    codec = MessageCodec("Boat_001", 1)
+    codec.select_format(FORMAT_BINARY)
+
+    print(f"{'message':<16}{'json B':>8}{'bin B':>8}{'json enc us':>13}{'bin enc us':>12}"
+          f"{'json dec us':>13}{'bin dec us':>12}")
+    for name, message in SAMPLE_MESSAGES.items():
+        json_frame = encode_json(codec.boat_name, message)
+        binary_frame = codec.encode(message)
+        assert codec.decode(binary_frame)["boat_id"] == codec.boat_id
+
+        json_encode = time_per_call(lambda m: encode_json(codec.boat_name, m), message)
+        binary_encode = time_per_call(codec.encode, message)
+        json_decode = time_per_call(json.loads, json_frame)
+        binary_decode = time_per_call(codec.decode, binary_frame)
+        print(f"{name:<16}{len(json_frame):>8}{len(binary_frame):>8}{json_encode:>13.2f}{binary_encode:>12.2f}"
+              f"{json_decode:>13.2f}{binary_decode:>12.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+# comms/command_ingest.py
+
+import json
+import threading
+import time
+from collections import deque
+from comms.wire_format import BROADCAST_ID, HEADER, MANUAL_CHANNELS, is_binary
+
+class CommandIngest:
+    # Sits between the XBee receive callback and the actuators. The callback only
+    # filters and decodes; the newest value per control channel is kept in a
+    # slot and applied by a separate thread, so bursts collapse instead of queueing.
+    def __init__(self, codec, apply_manual, apply_autonomous, on_accept=None, on_pending=None):
+        self.codec = codec                        # MessageCodec, decodes JSON and binary frames
+        self.apply_manual = apply_manual          # called with {channel: value}
+        self.apply_autonomous = apply_autonomous  # called with the decoded message
+        self.on_accept = on_accept                # called with (receive time, message type or 'command')
+                                                  # for every valid frame addressed to us
+        self.on_pending = on_pending              # called when a command becomes pending, instead of
+                                                  # the apply thread; the caller runs apply_pending()
+        # Byte patterns one of which must appear in a JSON frame addressed to this boat
+        self.address_tokens = (json.dumps(codec.boat_name).encode(), b'"all"')
+        self.boat_ids = (codec.boat_id, BROADCAST_ID)
+        self.handlers = {}              # message type -> handler, see add_handler()
+
+        self.pending_manual = {}        # channel -> newest value
+        self.manual_time = None         # receive time of the oldest pending manual command
+        self.pending_autonomous = None  # (message, receive time)
+        self.pending_messages = deque() # (handler, message, receive time), applied in order
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+
+        # Statistics
+        self.received = 0
+        self.dropped = 0
+        self.ignored = 0                # addressed to us, but not a command
+        self.coalesced = 0
+        self.applied = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.latency_last = 0.0
+
+    def add_handler(self, message_type, handler):
+        # Messages of this type are queued and passed to handler(message) on the
+        # apply path, in order and without coalescing; used for sequenced traffic
+        # such as mission uploads
+        self.handlers[message_type] = handler
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="command-ingest", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def on_frame(self, raw, receive_time=None):
+        if receive_time is None:
+            receive_time = time.monotonic()
+        self.received += 1
+
+        # Cheap check before decoding: binary frames carry the boat id in the header,
+        # JSON frames for other boats never mention our name or 'all'
+        if is_binary(raw):
+            if len(raw) < HEADER.size or raw[3] not in self.boat_ids:
+                self.dropped += 1
+                return
+        elif not any(token in raw for token in self.address_tokens):
+            self.dropped += 1
+            return
+
+        try:
+            data = self.codec.decode(raw)
+            if not self.codec.is_addressed_to_us(data):
+                self.dropped += 1
+                return
+            if self.on_accept is not None:
+                self.on_accept(receive_time, data.get('type', 'command'))
+            if data.get('type') == 'format_select':
+                # Ground station picked the wire format for our telemetry
+                self.codec.select_format(data.get('format'))
+                return
+            handler = self.handlers.get(data.get('type'))
+            if handler is not None:
+                with self.condition:
+                    idle = self._idle()
+                    self.pending_messages.append((handler, data, receive_time))
+                    self.condition.notify()
+                if idle and self.on_pending is not None:
+                    self.on_pending()
+                return
+            command_mode = data.get('command_mode')
+            if command_mode is None:
+                if 'type' in data or not any(channel in data for channel in MANUAL_CHANNELS):
+                    # Heartbeats, registrations and other traffic only count as link activity
+                    self.ignored += 1
+                    return
+                command_mode = 'manual'  # manual command without an explicit mode
+            if command_mode == 'manual':
+                values = {channel: float(data[channel]) for channel in MANUAL_CHANNELS if channel in data}
+            elif command_mode != 'autonomous':
+                print(f"Unknown command mode: {command_mode}")
+                self.dropped += 1
+                return
+        except (ValueError, TypeError, AttributeError) as e:
+            print(f"Error decoding data: {e}")
+            self.dropped += 1
+            return
+
+        with self.condition:
+            idle = self._idle()
+            # A command in one mode supersedes anything still pending in the other
+            if command_mode == 'manual':
+                if self.pending_autonomous is not None:
+                    self.coalesced += 1
+                    self.pending_autonomous = None
+                if self.manual_time is None:
+                    self.manual_time = receive_time
+                else:
+                    self.coalesced += 1
+                for channel, value in values.items():
+                    self.pending_manual[channel] = value
+            else:
+                self.coalesced += (self.manual_time is not None) + (self.pending_autonomous is not None)
+                self.pending_manual = {}
+                self.manual_time = None
+                self.pending_autonomous = (data, receive_time)
+            self.condition.notify()
+        if idle and self.on_pending is not None:
+            self.on_pending()
+
+    def get_stats(self):
+        # End-to-end latency (receive to applied) in seconds
+        return {
+            "received": self.received,
+            "dropped": self.dropped,
+            "ignored": self.ignored,
+            "coalesced": self.coalesced,
+            "applied": self.applied,
+            "latency_mean": self.latency_total / self.applied if self.applied else 0.0,
+            "latency_max": self.latency_max,
+            "latency_last": self.latency_last,
+        }
+
+    def _record_latency(self, receive_time):
+        latency = time.monotonic() - receive_time
+        self.applied += 1
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+        self.latency_last = latency
+
+    def _idle(self):
+        return self.manual_time is None and self.pending_autonomous is None and not self.pending_messages
+
+    def apply_pending(self):
+        # Apply the newest pending commands and the queued messages, if any,
+        # in the order they were received, without waiting
+        with self.condition:
+            manual, self.pending_manual = self.pending_manual, {}
+            manual_time, self.manual_time = self.manual_time, None
+            autonomous, self.pending_autonomous = self.pending_autonomous, None
+            messages, self.pending_messages = self.pending_messages, deque()
+
+        work = [(receive_time, handler, message) for handler, message, receive_time in messages]
+        if autonomous is not None:
+            work.append((autonomous[1], self.apply_autonomous, autonomous[0]))
+        if manual_time is not None:
+            work.append((manual_time, self.apply_manual, manual))
+        work.sort(key=lambda item: item[0])
+        for receive_time, apply, payload in work:
+            try:
+                apply(payload)
+                self._record_latency(receive_time)
+            except Exception as e:
+                print(f"Error applying command: {e}")
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.running and self._idle():
+                    self.condition.wait()
+                if not self.running:
+                    break
+            self.apply_pending()
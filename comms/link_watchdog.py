@@ -0,0 +1,151 @@
+# comms/link_watchdog.py
+
+import bisect
+import threading
+import time
+
+# Upper edges of the inter-arrival histogram bins, in seconds
+INTERVAL_BINS = (0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, float('inf'))
+
+class LinkWatchdog:
+    # Tracks when the ground station was last heard from: every accepted command
+    # and every acknowledged transmission feeds it. The feed only stores a
+    # monotonic timestamp; the watchdog thread sleeps until the next deadline,
+    # so the receive path never waits on it. Without start(), the owner calls
+    # check() at the returned deadlines instead. stages is a list of
+    # (seconds of silence, action) pairs; on_failsafe(action) is called once per
+    # stage in order, and on_restore(outage) when the link comes back.
+    def __init__(self, stages, on_failsafe, on_restore=None):
+        self.stages = sorted(stages)
+        self.on_failsafe = on_failsafe
+        self.on_restore = on_restore
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.running = False
+        self.thread = None
+        self.last_heard = time.monotonic()  # time of the newest feed
+        self.stage = -1                 # index of the last stage triggered, -1 while the link is up
+        self.lost_at = None
+
+        # Statistics
+        self.last_time = {}             # source -> time of its previous feed
+        self.histograms = {}            # source -> counts per INTERVAL_BINS bin
+        self.counts = {}
+        self.interval_max = {}
+        self.outages = 0
+        self.outage_max = 0.0
+        self.reaction_max = 0.0         # deadline to failsafe action
+        self.actions = {}
+
+    def feed(self, source='command', now=None):
+        if now is None:
+            now = time.monotonic()
+        with self.lock:
+            previous = self.last_time.get(source)
+            self.last_time[source] = now
+            self.counts[source] = self.counts.get(source, 0) + 1
+            if previous is not None:
+                interval = now - previous
+                histogram = self.histograms.setdefault(source, [0] * len(INTERVAL_BINS))
+                histogram[bisect.bisect_left(INTERVAL_BINS, interval)] += 1
+                self.interval_max[source] = max(self.interval_max.get(source, 0.0), interval)
+            self.last_heard = now
+            if self.stage >= 0:
+                self.wake.set()     # in failsafe: restore right away
+
+    def start(self):
+        # The link counts as heard at start, so a boat that never hears the
+        # ground station still goes through the failsafe stages
+        self.last_heard = time.monotonic()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="link-watchdog", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def link_up(self):
+        return self.stage < 0
+
+    def silence(self):
+        return time.monotonic() - self.last_heard
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "link_up": self.stage < 0,
+                "silence": self.silence(),
+                "counts": dict(self.counts),
+                "interval_bins": INTERVAL_BINS,
+                "interval_histograms": {source: list(bins) for source, bins in self.histograms.items()},
+                "interval_max": dict(self.interval_max),
+                "outages": self.outages,
+                "outage_max": self.outage_max,
+                "reaction_max": self.reaction_max,
+                "actions": dict(self.actions),
+            }
+
+    def check(self, now=None):
+        # Runs a pending restore and every stage that is due. Returns the seconds
+        # until the next stage deadline, or None when no stage is left.
+        if now is None:
+            now = time.monotonic()
+        while True:
+            with self.lock:
+                last_heard = self.last_heard
+                stage = self.stage
+                if stage >= 0 and last_heard > self.lost_at:
+                    outage = now - self.lost_at
+                    self.stage = stage = -1
+                    self.outage_max = max(self.outage_max, outage)
+                else:
+                    outage = None
+            if outage is not None and self.on_restore is not None:
+                self.on_restore(outage)
+
+            if stage + 1 >= len(self.stages):
+                return None
+            after, action = self.stages[stage + 1]
+            deadline = last_heard + after
+            if now < deadline:
+                return deadline - now
+            with self.lock:
+                if self.stage < 0:
+                    self.outages += 1
+                    self.lost_at = last_heard
+                self.stage = stage + 1
+                self.reaction_max = max(self.reaction_max, now - deadline)
+                self.actions[action] = self.actions.get(action, 0) + 1
+            try:
+                self.on_failsafe(action)
+            except Exception as e:
+                print(f"Error in link failsafe '{action}': {e}")
+
+    def _run(self):
+        while self.running:
+            self.wake.clear()
+            self.wake.wait(self.check())
+
+if __name__ == '__main__':
+    # Feeds with random gaps; every gap longer than the first stage must be
+    # caught within 100 ms of its deadline
+    import random
+    events = []
+    watchdog = LinkWatchdog([(0.3, 'hold'), (0.6, 'safe')],
+                            on_failsafe=lambda action: events.append((time.monotonic(), action)),
+                            on_restore=lambda outage: events.append((time.monotonic(), 'restore')))
+    watchdog.start()
+    end = time.monotonic() + 5.0
+    while time.monotonic() < end:
+        watchdog.feed('command')
+        time.sleep(random.choice((0.02, 0.05, 0.1, 0.2, 0.4, 0.8)))
+    watchdog.stop()
+    stats = watchdog.get_stats()
+    for bin_end, count in zip(INTERVAL_BINS, stats["interval_histograms"]["command"]):
+        print(f"<= {bin_end:5.2f} s: {count}")
+    print(f"outages {stats['outages']}, longest {stats['outage_max']:.2f} s, actions {stats['actions']}, "
+          f"worst reaction {stats['reaction_max'] * 1000:.1f} ms")
@@ -0,0 +1,92 @@
+# comms/telemetry.py
+
+import threading
+import time
+from comms.wire_format import FORMAT_BINARY
+
+class TelemetryAggregator:
+    # Collects the latest value from every producer (GPS, heading, servos,
+    # health) and sends them as one frame at a fixed rate. The telemetry frame
+    # doubles as the heartbeat, so each boat has a single periodic transmission.
+    # A JSON frame is about ten times the binary one, so until the ground station
+    # selects the binary format frames go out at json_rate_hz only.
+    def __init__(self, codec, send, rate_hz=1.0, json_rate_hz=0.2):
+        self.codec = codec
+        self.send = send            # called with each encoded frame
+        self.period = 1.0 / rate_hz
+        self.json_period = 1.0 / json_rate_hz
+        self.last_sent = None
+        self.lock = threading.Lock()
+        self.location = None
+        self.heading = None
+        self.servos = None
+        self.health = {}
+        self.start_time = time.monotonic()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.frames_sent = 0
+        self.send_errors = 0
+
+    def update_location(self, latitude, longitude):
+        with self.lock:
+            self.location = {"latitude": latitude, "longitude": longitude}
+
+    def update_heading(self, heading):
+        with self.lock:
+            self.heading = heading
+
+    def update_servos(self, rudder_angle, sail_angle):
+        with self.lock:
+            self.servos = {"rudder_angle": rudder_angle, "sail_angle": sail_angle}
+
+    def update_health(self, **values):
+        with self.lock:
+            self.health.update(values)
+
+    def build_message(self):
+        with self.lock:
+            return {
+                "type": "telemetry",
+                "location": self.location,
+                "heading": self.heading,
+                "servos": self.servos,
+                "health": {**self.health, "uptime": int(time.monotonic() - self.start_time)},
+            }
+
+    def send_now(self):
+        self.last_sent = time.monotonic()
+        try:
+            self.send(self.codec.encode(self.build_message()))
+            self.frames_sent += 1
+        except Exception as e:
+            self.send_errors += 1
+            print(f"Error sending telemetry: {e}")
+
+    def send_due(self):
+        # Called every period; skips the frames the JSON rate leaves out
+        if self.codec.format != FORMAT_BINARY and self.last_sent is not None and \
+                time.monotonic() - self.last_sent < self.json_period - self.period / 2:
+            return
+        self.send_now()
+
+    def start(self):
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="telemetry", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def _run(self):
+        next_send = time.monotonic()
+        while not self.stop_event.is_set():
+            self.send_due()
+            # Fixed rate: schedule from the previous deadline, not from when sending finished
+            next_send += self.period
+            now = time.monotonic()
+            if next_send < now:
+                next_send = now
+            self.stop_event.wait(next_send - now)
@@ -0,0 +1,210 @@
+# comms/wire_format.py
+
+import json
+import struct
+
+# Binary frames start with MAGIC, which can never start a JSON message ('{')
+MAGIC = 0xA5
+VERSION = 1
+BROADCAST_ID = 0xFF  # boat id addressing every boat
+
+FORMAT_JSON = 'json'
+FORMAT_BINARY = 'bin1'
+
+HEADER = struct.Struct('<BBBB')          # magic, version, message type, boat id
+POSITION = struct.Struct('<ii')          # latitude, longitude in 1e-7 degrees
+MANUAL = struct.Struct('<Bhhh')          # channel mask, rudder, sail, throttle in 0.01 units
+# flags, latitude, longitude (1e-7 deg), heading (0.01 deg), rudder, sail (0.01 deg), uptime (s)
+TELEMETRY = struct.Struct('<BiiHhhI')
+
+# Message type codes
+REGISTRATION = 1
+HEARTBEAT = 2
+LOCATION_UPDATE = 3
+MANUAL_COMMAND = 4
+AUTONOMOUS_COMMAND = 5
+TELEMETRY_FRAME = 6
+KEEPALIVE = 7           # ground station to boat, only proves the link is up
+
+# Telemetry flags
+TELEMETRY_LOCATION = 0x01
+TELEMETRY_HEADING = 0x02
+TELEMETRY_SERVOS = 0x04
+TELEMETRY_AUTONOMOUS = 0x08
+
+MANUAL_CHANNELS = ('rudder_angle', 'sail_angle', 'throttle')
+
+# Message types with a binary layout; anything else is always sent as JSON
+BINARY_MESSAGE_TYPES = ('registration', 'heartbeat', 'keepalive', 'location_update', 'telemetry', 'manual',
+                        'autonomous')
+
+def _degrees_to_int(value):
+    return int(round(value * 1e7))
+
+def _centi(value):
+    return int(round(value * 100))
+
+def message_type_of(message):
+    # Telemetry messages carry a 'type'; commands from the ground station a 'command_mode'
+    message_type = message.get('type')
+    if message_type is not None:
+        return message_type
+    return message.get('command_mode', 'manual')
+
+def encode_binary(message, boat_id):
+    # message has the same shape as the JSON message (without boat_name)
+    message_type = message_type_of(message)
+    if message_type == 'registration':
+        return HEADER.pack(MAGIC, VERSION, REGISTRATION, boat_id)
+    if message_type == 'heartbeat':
+        return HEADER.pack(MAGIC, VERSION, HEARTBEAT, boat_id)
+    if message_type == 'keepalive':
+        return HEADER.pack(MAGIC, VERSION, KEEPALIVE, boat_id)
+    if message_type == 'location_update':
+        location = message['location']
+        return HEADER.pack(MAGIC, VERSION, LOCATION_UPDATE, boat_id) + POSITION.pack(
+            _degrees_to_int(location['latitude']), _degrees_to_int(location['longitude']))
+    if message_type == 'telemetry':
+        return HEADER.pack(MAGIC, VERSION, TELEMETRY_FRAME, boat_id) + _pack_telemetry(message)
+    if message_type == 'manual':
+        mask = 0
+        values = []
+        for bit, channel in enumerate(MANUAL_CHANNELS):
+            if channel in message:
+                mask |= 1 << bit
+                values.append(_centi(message[channel]))
+            else:
+                values.append(0)
+        return HEADER.pack(MAGIC, VERSION, MANUAL_COMMAND, boat_id) + MANUAL.pack(mask, *values)
+    if message_type == 'autonomous':
+        return HEADER.pack(MAGIC, VERSION, AUTONOMOUS_COMMAND, boat_id) + POSITION.pack(
+            _degrees_to_int(message['target_gps_latitude']), _degrees_to_int(message['target_gps_longitude']))
+    raise ValueError(f"No binary encoding for message type: {message_type}")
+
+def _pack_telemetry(message):
+    flags = 0
+    latitude = longitude = heading = rudder = sail = 0
+    location = message.get('location')
+    if location is not None:
+        flags |= TELEMETRY_LOCATION
+        latitude = _degrees_to_int(location['latitude'])
+        longitude = _degrees_to_int(location['longitude'])
+    if message.get('heading') is not None:
+        flags |= TELEMETRY_HEADING
+        heading = _centi(message['heading'] % 360.0) % 36000
+    servos = message.get('servos')
+    if servos is not None:
+        flags |= TELEMETRY_SERVOS
+        rudder = _centi(servos.get('rudder_angle') or 0)
+        sail = _centi(servos.get('sail_angle') or 0)
+    health = message.get('health', {})
+    if health.get('command_mode') == 'autonomous':
+        flags |= TELEMETRY_AUTONOMOUS
+    return TELEMETRY.pack(flags, latitude, longitude, heading, rudder, sail, int(health.get('uptime', 0)))
+
+def _unpack_telemetry(raw, boat_id):
+    flags, latitude, longitude, heading, rudder, sail, uptime = TELEMETRY.unpack_from(raw, HEADER.size)
+    message = {
+        "type": "telemetry",
+        "boat_id": boat_id,
+        "location": None,
+        "heading": None,
+        "servos": None,
+        "health": {"uptime": uptime,
+                   "command_mode": "autonomous" if flags & TELEMETRY_AUTONOMOUS else "manual"},
+    }
+    if flags & TELEMETRY_LOCATION:
+        message["location"] = {"latitude": latitude / 1e7, "longitude": longitude / 1e7}
+    if flags & TELEMETRY_HEADING:
+        message["heading"] = heading / 100
+    if flags & TELEMETRY_SERVOS:
+        message["servos"] = {"rudder_angle": rudder / 100, "sail_angle": sail / 100}
+    return message
+
+def is_binary(raw):
+    return len(raw) > 0 and raw[0] == MAGIC
+
+def _check_payload(raw, layout):
+    if len(raw) < HEADER.size + layout.size:
+        raise ValueError(f"Binary frame too short: {len(raw)} bytes, need {HEADER.size + layout.size}")
+
+def decode_binary(raw):
+    # Returns the message in its JSON shape, with boat_id instead of boat_name
+    if len(raw) < HEADER.size:
+        raise ValueError("Binary frame too short")
+    magic, version, message_type, boat_id = HEADER.unpack_from(raw)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Unsupported binary frame version: {version}")
+    if message_type == REGISTRATION:
+        return {"type": "registration", "boat_id": boat_id}
+    if message_type == HEARTBEAT:
+        return {"type": "heartbeat", "boat_id": boat_id}
+    if message_type == KEEPALIVE:
+        return {"type": "keepalive", "boat_id": boat_id}
+    if message_type == LOCATION_UPDATE:
+        _check_payload(raw, POSITION)
+        latitude, longitude = POSITION.unpack_from(raw, HEADER.size)
+        return {"type": "location_update", "boat_id": boat_id,
+                "location": {"latitude": latitude / 1e7, "longitude": longitude / 1e7}}
+    if message_type == TELEMETRY_FRAME:
+        _check_payload(raw, TELEMETRY)
+        return _unpack_telemetry(raw, boat_id)
+    if message_type == MANUAL_COMMAND:
+        _check_payload(raw, MANUAL)
+        mask, *values = MANUAL.unpack_from(raw, HEADER.size)
+        message = {"boat_id": boat_id, "command_mode": "manual"}
+        for bit, channel in enumerate(MANUAL_CHANNELS):
+            if mask & (1 << bit):
+                message[channel] = values[bit] / 100
+        return message
+    if message_type == AUTONOMOUS_COMMAND:
+        _check_payload(raw, POSITION)
+        latitude, longitude = POSITION.unpack_from(raw, HEADER.size)
+        return {"boat_id": boat_id, "command_mode": "autonomous",
+                "target_gps_latitude": latitude / 1e7, "target_gps_longitude": longitude / 1e7}
+    raise ValueError(f"Unknown binary message type: {message_type}")
+
+class MessageCodec:
+    # Encodes outgoing messages in the format negotiated with the ground station.
+    # The boat registers in JSON, offering the binary format and its boat id; it
+    # switches once the ground station answers with a 'format_select' message.
+    def __init__(self, boat_name, boat_id):
+        self.boat_name = boat_name
+        self.boat_id = boat_id
+        self.format = FORMAT_JSON
+
+    def select_format(self, selected_format):
+        if selected_format in (FORMAT_JSON, FORMAT_BINARY):
+            self.format = selected_format
+            print(f"Using {selected_format} wire format")
+        else:
+            print(f"Unknown wire format: {selected_format}")
+
+    def registration(self, keepalive_period=None):
+        # Always JSON, so ground stations without binary support can read it.
+        # keepalive_period asks the ground station to send a keepalive that often.
+        message = {
+            "type": "registration",
+            "boat_name": self.boat_name,
+            "boat_id": self.boat_id,
+            "formats": [FORMAT_BINARY, FORMAT_JSON],
+        }
+        if keepalive_period is not None:
+            message["keepalive_period"] = keepalive_period
+        return json.dumps(message)
+
+    def encode(self, message):
+        if self.format == FORMAT_BINARY and message_type_of(message) in BINARY_MESSAGE_TYPES:
+            return encode_binary(message, self.boat_id)
+        return json.dumps({"type": message["type"], "boat_name": self.boat_name,
+                           **{key: value for key, value in message.items() if key != "type"}})
+
+    def decode(self, raw):
+        if is_binary(raw):
+            return decode_binary(raw)
+        return json.loads(raw)
+
+    def is_addressed_to_us(self, message):
+        if 'boat_id' in message:
+            return message['boat_id'] in (self.boat_id, BROADCAST_ID)
+        return message.get('boat_name') in (self.boat_name, 'all')
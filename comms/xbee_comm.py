@@ -1,20 +1,192 @@
 # comms/xbee_comm.py
 
-from digi.xbee.devices import XBeeDevice
-import json
+from digi.xbee.devices import XBeeDevice, RemoteXBeeDevice
+from digi.xbee.models.address import XBee64BitAddress
+from digi.xbee.exception import TransmitException, TimeoutException
+from collections import deque
+import heapq
+import itertools
+import threading
+import time
 
 port_address = "/dev/ttyXbee"
+
+# Send priorities, lower values are sent first
+PRIORITY_CONTROL = 0    # command acknowledgements
+PRIORITY_ALARM = 1
+PRIORITY_TELEMETRY = 2
+
+class TxSlotScheduler:
+    # Spreads the fleet's transmissions over a repeating frame of time slots.
+    # Each boat owns slot boat_id % slot_count and only starts sending inside it,
+    # which keeps boats from colliding. Slots are aligned to the wall clock, so
+    # boats need roughly synchronized clocks (NTP or GPS time).
+    def __init__(self, boat_id, slot_count=8, slot_length=0.05, guard=0.005):
+        self.slot_count = slot_count
+        self.slot_length = slot_length
+        self.guard = guard  # no transmission starts this close to the end of the slot
+        self.slot = boat_id % slot_count
+        self.frame_length = slot_count * slot_length
+
+    def time_to_slot(self, now=None):
+        if now is None:
+            now = time.time()
+        position = now % self.frame_length
+        slot_start = self.slot * self.slot_length
+        if slot_start <= position < slot_start + self.slot_length - self.guard:
+            return 0.0
+        return (slot_start - position) % self.frame_length
+
+    def wait_for_slot(self):
+        delay = self.time_to_slot()
+        if delay > 0:
+            time.sleep(delay)
+
 class XBeeComm:
-    def __init__(self, port= port_address, baud_rate=115200):
+    def __init__(self, port= port_address, baud_rate=115200, ground_station_address=None,
+                 boat_id=None, slot_count=8, slot_length=0.05, max_retries=3, queue_size=32):
         self.device = XBeeDevice(port, baud_rate)
         self.device.open()
 
+        # Ground station for addressed (acknowledged) transmissions
+        self.ground_station = None
+        if ground_station_address:
+            self.ground_station = RemoteXBeeDevice(
+                self.device, XBee64BitAddress.from_hex_string(ground_station_address))
+        self.max_retries = max_retries
+
+        # Transmissions only start in this boat's time slot
+        self.scheduler = None
+        if boat_id is not None:
+            self.scheduler = TxSlotScheduler(boat_id, slot_count, slot_length)
+
+        # Statistics
+        self.delivered = 0
+        self.failed = 0
+        self.retried = 0
+        self.latencies = deque(maxlen=256)  # seconds from send call to acknowledgement
+        self.delivered_callbacks = []       # called with the time of every acknowledged transmission
+
+        # Single TX worker fed by a bounded priority queue, see send()
+        self.queue_size = queue_size
+        self.queue = []                     # heap of (priority, sequence, data, acknowledged, enqueue time)
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+        self.running = True
+        self.drain_deadline = None          # set by close(), queued messages are sent until then
+        self.queued = 0
+        self.sent = 0
+        self.dropped = {PRIORITY_CONTROL: 0, PRIORITY_ALARM: 0, PRIORITY_TELEMETRY: 0}
+        self.queue_wait_max = 0.0
+        self.tx_thread = threading.Thread(target=self._tx_worker, name="xbee-tx", daemon=True)
+        self.tx_thread.start()
+
     def add_data_received_callback(self, callback):
         self.device.add_data_received_callback(callback)
 
-    def close(self):
+    def remove_data_received_callback(self, callback):
+        self.device.del_data_received_callback(callback)
+
+    def add_delivered_callback(self, callback):
+        self.delivered_callbacks.append(callback)
+
+    def close(self, timeout=2.0):
+        # Sends what is still queued, such as acknowledgements queued during
+        # shutdown, for up to timeout seconds; whatever is left is counted as dropped
+        with self.condition:
+            self.drain_deadline = time.monotonic() + timeout
+            self.running = False
+            self.condition.notify()
+        self.tx_thread.join()
+        with self.condition:
+            if self.queue:
+                print(f"Dropped {len(self.queue)} queued messages at close")
+            for priority, *_ in self.queue:
+                self.dropped[priority] = self.dropped.get(priority, 0) + 1
+            self.queue.clear()
         if self.device is not None and self.device.is_open():
             self.device.close()
-            
+
+    def send(self, data, priority=PRIORITY_TELEMETRY, acknowledged=True):
+        # Non-blocking: queue the message for the TX worker. When the queue is full
+        # the oldest message of the lowest priority is dropped, unless everything
+        # queued outranks the new message, in which case the new one is dropped.
+        with self.condition:
+            if len(self.queue) >= self.queue_size:
+                victim = max(self.queue, key=lambda item: (item[0], -item[1]))
+                if victim[0] < priority:
+                    self.dropped[priority] = self.dropped.get(priority, 0) + 1
+                    return False
+                self.queue.remove(victim)
+                heapq.heapify(self.queue)
+                self.dropped[victim[0]] = self.dropped.get(victim[0], 0) + 1
+            heapq.heappush(self.queue, (priority, next(self.sequence), data, acknowledged, time.monotonic()))
+            self.queued += 1
+            self.condition.notify()
+            return True
+
+    def _tx_worker(self):
+        while True:
+            with self.condition:
+                while self.running and not self.queue:
+                    self.condition.wait()
+                if not self.running and (not self.queue or time.monotonic() >= self.drain_deadline):
+                    break
+                priority, _, data, acknowledged, enqueue_time = heapq.heappop(self.queue)
+            self.queue_wait_max = max(self.queue_wait_max, time.monotonic() - enqueue_time)
+            try:
+                if acknowledged:
+                    delivered = self.send_data_to_ground_station(data)
+                else:
+                    self.send_data(data)
+                    delivered = True
+                if delivered:
+                    self.sent += 1
+            except Exception as e:
+                print(f"Error sending data: {e}")
+
     def send_data(self, data):
+        if self.scheduler is not None:
+            self.scheduler.wait_for_slot()
         self.device.send_data_broadcast(data)
+
+    def send_data_to_ground_station(self, data):
+        # Unicast to the ground station; the radio reports whether the frame was
+        # acknowledged and we retry in the next slots if it was not.
+        if self.ground_station is None:
+            self.send_data(data)
+            return True
+        start = time.monotonic()
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0:
+                self.retried += 1
+            if self.scheduler is not None:
+                self.scheduler.wait_for_slot()
+            try:
+                self.device.send_data(self.ground_station, data)
+                self.delivered += 1
+                now = time.monotonic()
+                self.latencies.append(now - start)
+                for callback in self.delivered_callbacks:
+                    callback(now)
+                return True
+            except (TransmitException, TimeoutException) as e:
+                print(f"Transmission to ground station failed (attempt {attempt + 1}): {e}")
+        self.failed += 1
+        return False
+
+    def get_stats(self):
+        latencies = list(self.latencies)
+        return {
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "retried": self.retried,
+            "latency_mean": sum(latencies) / len(latencies) if latencies else 0.0,
+            "latency_max": max(latencies) if latencies else 0.0,
+            "latencies": latencies,
+            "queue_depth": len(self.queue),
+            "queued": self.queued,
+            "sent": self.sent,
+            "dropped": dict(self.dropped),
+            "queue_wait_max": self.queue_wait_max,
+        }
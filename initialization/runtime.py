@@ -0,0 +1,203 @@
+# initialization/runtime.py
+
+import asyncio
+import concurrent.futures
+import inspect
+import math
+import signal
+import time
+from collections import deque
+
+class TaskTiming:
+    # Wakeup lateness of one task: how long after its deadline the loop ran it
+    def __init__(self, period=None):
+        self.period = period
+        self.jitter = deque(maxlen=1000)
+        self.run_times = deque(maxlen=1000)
+        self.runs = 0
+        self.overruns = 0
+
+    def get_stats(self):
+        jitter = sorted(self.jitter)
+        return {
+            "period": self.period,
+            "runs": self.runs,
+            "overruns": self.overruns,
+            "jitter_mean": sum(jitter) / len(jitter) if jitter else 0.0,
+            "jitter_p99": jitter[int(len(jitter) * 0.99)] if jitter else 0.0,
+            "jitter_max": jitter[-1] if jitter else 0.0,
+            "run_time_max": max(self.run_times) if self.run_times else 0.0,
+        }
+
+class Runtime:
+    # One asyncio event loop for the whole boat. Periodic work runs as tasks on
+    # the loop, blocking reads run on a small executor, and callbacks arriving on
+    # library threads are moved onto the loop with call_soon_threadsafe, so the
+    # boat's state is only changed from the loop thread. On shutdown every task
+    # is cancelled, then the shutdown steps run in reverse order of registration,
+    # so inputs stop before the outputs they drive.
+    def __init__(self, io_workers=6):
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="io")
+        self.loop = None
+        self.stop_event = None
+        self.tasks = {}             # name -> asyncio.Task
+        self.readers = {}           # name -> future of a blocking function on the executor
+        self.timing = {}            # name -> TaskTiming
+        self.shutdown_steps = []    # (name, function, blocking)
+
+    def run(self, setup):
+        # Runs setup(runtime) on a new loop, then everything until SIGINT/SIGTERM
+        asyncio.run(self._main(setup))
+
+    def request_stop(self):
+        self.stop_event.set()
+
+    def threadsafe(self, callback):
+        # Returns a function that can be called from any thread and runs callback on the loop
+        loop = self.loop
+
+        def call(*args):
+            try:
+                loop.call_soon_threadsafe(self._call, callback, args)
+            except RuntimeError:
+                pass    # loop already closed, the boat is shutting down
+        return call
+
+    def spawn(self, name, coroutine):
+        self.tasks[name] = self.loop.create_task(coroutine, name=name)
+        return self.tasks[name]
+
+    def periodic(self, name, rate_hz, callback, blocking=False):
+        # Calls callback every 1 / rate_hz seconds on the loop, or on the executor if it blocks
+        timing = self.timing[name] = TaskTiming(1.0 / rate_hz)
+        return self.spawn(name, self._periodic(name, timing, callback, blocking))
+
+    async def sleep(self, name, delay):
+        # asyncio.sleep that records how late the task woke up
+        timing = self.timing.setdefault(name, TaskTiming())
+        deadline = self.loop.time() + max(0.0, delay)
+        await asyncio.sleep(max(0.0, delay))
+        timing.jitter.append(self.loop.time() - deadline)
+        timing.runs += 1
+
+    async def run_in_executor(self, function, *args):
+        return await self.loop.run_in_executor(self.executor, function, *args)
+
+    def run_blocking(self, name, function, *args):
+        # Runs a blocking loop (a serial reader) on the executor until it returns
+        future = self.loop.run_in_executor(self.executor, function, *args)
+        future.add_done_callback(lambda done: self._reader_done(name, done))
+        self.readers[name] = future
+        return future
+
+    def add_shutdown(self, name, function, blocking=False):
+        # Register right after creating a component; function may return an
+        # awaitable, blocking functions run on the executor
+        self.shutdown_steps.append((name, function, blocking))
+
+    def get_stats(self):
+        return {name: timing.get_stats() for name, timing in self.timing.items()}
+
+    def report(self):
+        lines = [f"{'task':16s} {'period':>8s} {'runs':>7s} {'overruns':>8s} "
+                 f"{'jitter mean':>11s} {'p99':>8s} {'max':>8s} {'run max':>8s}"]
+        for name, stats in self.get_stats().items():
+            period = f"{stats['period'] * 1000:.0f} ms" if stats['period'] else "-"
+            lines.append(f"{name:16s} {period:>8s} {stats['runs']:7d} {stats['overruns']:8d} "
+                         f"{stats['jitter_mean'] * 1000:8.2f} ms {stats['jitter_p99'] * 1000:5.2f} ms "
+                         f"{stats['jitter_max'] * 1000:5.2f} ms {stats['run_time_max'] * 1000:5.2f} ms")
+        return "\n".join(lines)
+
+    def _call(self, callback, args):
+        try:
+            callback(*args)
+        except Exception as e:
+            print(f"Error in {getattr(callback, '__name__', callback)}: {e}")
+
+    def _reader_done(self, name, future):
+        if not future.cancelled() and future.exception() is not None:
+            print(f"{name} reader stopped: {future.exception()}")
+
+    async def _periodic(self, name, timing, callback, blocking):
+        loop = self.loop
+        deadline = loop.time()
+        while True:
+            wake = loop.time()
+            timing.jitter.append(wake - deadline)
+            try:
+                if blocking:
+                    await loop.run_in_executor(self.executor, callback)
+                else:
+                    callback()
+            except Exception as e:
+                print(f"Error in task {name}: {e}")
+            finished = loop.time()
+            timing.run_times.append(finished - wake)
+            timing.runs += 1
+            deadline += timing.period
+            if finished > deadline:
+                # Missed the next deadline; skip the lost ticks instead of bursting
+                timing.overruns += 1
+                deadline += math.ceil((finished - deadline) / timing.period) * timing.period
+            await asyncio.sleep(deadline - loop.time())
+
+    async def _main(self, setup):
+        self.loop = asyncio.get_running_loop()
+        self.stop_event = asyncio.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            self.loop.add_signal_handler(signum, self.request_stop)
+        try:
+            await setup(self)
+            await self.stop_event.wait()
+            print("Stopping...")
+        finally:
+            await self._shutdown()
+
+    async def _shutdown(self):
+        tasks = list(self.tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for name, function, blocking in reversed(self.shutdown_steps):
+            try:
+                if blocking:
+                    await self.run_in_executor(function)
+                else:
+                    result = function()
+                    if inspect.isawaitable(result):
+                        await result
+            except Exception as e:
+                print(f"Error during shutdown ({name}): {e}")
+        # Readers return once their shutdown step closed them
+        pending = [future for future in self.readers.values() if not future.done()]
+        if pending:
+            _, pending = await asyncio.wait(pending, timeout=2.0)
+            for future in pending:
+                print(f"A reader did not stop: {future}")
+        self.executor.shutdown(wait=not pending)
+        print(f"Scheduler latency:\n{self.report()}")
+
+if __name__ == '__main__':
+    # Wakeup jitter of a few typical tasks while a blocking reader and a slow
+    # task share the loop. Run it on the Pi to see what the boat's tasks get.
+    def slow_step():
+        end = time.perf_counter() + 0.004
+        while time.perf_counter() < end:
+            pass
+
+    def reader(stop):
+        while not stop.is_set():
+            time.sleep(0.01)
+
+    async def setup(runtime):
+        import threading
+        stop = threading.Event()
+        runtime.periodic("control", 20.0, lambda: None)
+        runtime.periodic("windvane", 50.0, lambda: time.sleep(0.0005), blocking=True)
+        runtime.periodic("telemetry", 1.0, lambda: None)
+        runtime.periodic("slow", 10.0, slow_step)
+        runtime.run_blocking("reader", reader, stop)
+        runtime.add_shutdown("reader", stop.set)
+        runtime.loop.call_later(5.0, runtime.request_stop)
+
+    Runtime().run(setup)
@@ -1,159 +1,384 @@
 # main.py
 
-import json
+import asyncio
+import os
 import time
-import threading
 import random  # Import random module
 from actuators.servos import Servos
-from comms.xbee_comm import XBeeComm  # Import the XBeeComm class
+from actuators.pwm_backends import ServoCalibration, make_pwm_backend
+from actuators.esc import ESC
+from comms.xbee_comm import XBeeComm, PRIORITY_CONTROL, PRIORITY_TELEMETRY  # Import the XBeeComm class
+from comms.command_ingest import CommandIngest
+from comms.wire_format import MessageCodec
+from comms.telemetry import TelemetryAggregator
+from comms.link_watchdog import LinkWatchdog
+from sensors.gps_reader import GPSReader
+from sensors.wit_imu import open_wit_imu
+from sensors.encoder_AS5600 import WindvaneEncoder
+from sensors.as5600_i2c import AS5600
+from navigation.estimator import NavigationEstimator
+from navigation.controller import NavigationController
+from navigation.mission import Mission
 from initialization.config import load_config  # Import load_config
+from initialization.runtime import Runtime
+from serial import SerialException
 
 # Load configuration
 config = load_config()
 boat_name = config['boat_name']
+boat_id = config['boat_id']  # Short id used in the binary wire format
 
-# Global variables
-command_mode = 'manual'
-target_gps_latitude = None
-target_gps_longitude = None
+# Uploaded mission and its progress, unless config names another file
+MISSION_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'initialization', 'mission.json')
 
-def main():
-    global command_mode, target_gps_latitude, target_gps_longitude
-
-    # Initialize actuators
-    servos = Servos()
+# Seconds between link checks while the link is down, so a restore is noticed quickly
+LINK_RESTORE_CHECK = 0.05
 
-    # Initialize XBee communication
-    xbee_comm = XBeeComm()
+# Keepalive periods after registration before a silent ground station is reported
+KEEPALIVE_GRACE = 10
 
-    # Send registration message
-    registration_message = json.dumps({
-        "type": "registration",
-        "boat_name": boat_name
-    })
-    xbee_comm.send_data(registration_message)
+async def setup(runtime):
+    # Builds the boat and starts its tasks on the runtime's event loop. The boat's
+    # state (command mode, targets, mission) only changes on the loop thread:
+    # callbacks from the radio and the serial readers go through runtime.threadsafe().
+    # Every component registers its shutdown step as soon as it exists.
+    command_mode = 'manual'
 
-    # Start heartbeat thread
-    def heartbeat_loop():
-        while True:
-            heartbeat_message = json.dumps({
-                "type": "heartbeat",
-                "boat_name": boat_name
-            })
-            xbee_comm.send_data(heartbeat_message)
-            time.sleep(10)  # Send heartbeat every 10 seconds
+    # Initialize actuators
+    calibration = {channel: ServoCalibration(**values)
+                   for channel, values in config.get('servo_calibration', {}).items()}
+    backend = make_pwm_backend(config.get('pwm_backend', 'auto'))
+    rudder_pin, sail_pin = config.get('rudder_pin', 16), config.get('sail_pin', 18)
+    # Hardware PWM (sysfs) only exists on some pins; fail here rather than half-way through Servos
+    backend.check_pins([pin for pin in (rudder_pin, sail_pin, config.get('esc_pin')) if pin is not None])
+    servos = Servos(rudder_pin, sail_pin, backend=backend, calibration=calibration,
+                    limits=config.get('servo_limits'))
+    runtime.add_shutdown('servos', servos.cleanup)
+
+    # Motor speed controller on the servo PWM backend; arms and ramps on its own
+    # thread, so its failsafe does not depend on the loop
+    esc = None
+    if config.get('esc_pin') is not None:
+        esc = ESC(servos.backend, config['esc_pin'],
+                  min_us=config.get('esc_min_us', 1000), max_us=config.get('esc_max_us', 2000),
+                  reversible=config.get('esc_reversible', False),
+                  ramp_rate=config.get('esc_ramp_rate', 50.0), timeout=config.get('esc_timeout', 1.0),
+                  calibrate=config.get('esc_calibrate', False))
+        esc.start()
+
+        def stop_esc():
+            esc.stop()
+            print(f"ESC stats: {esc.get_stats()}")
+        runtime.add_shutdown('esc', stop_esc)
 
-    threading.Thread(target=heartbeat_loop, daemon=True).start()
+    # Initialize XBee communication
+    xbee_comm = XBeeComm(ground_station_address=config.get('ground_station_address'),
+                         boat_id=boat_id,
+                         slot_count=config.get('tx_slot_count', 8),
+                         slot_length=config.get('tx_slot_length', 0.05))
 
-    # Start simulated GPS data thread
-    def gps_simulation_loop():
+    def close_radio():
+        # Closing sends what is still queued first, so the drops include it
+        xbee_comm.close()
+        stats = xbee_comm.get_stats()
+        print(f"Radio stats: delivered {stats['delivered']}, failed {stats['failed']}, "
+              f"retried {stats['retried']}, mean latency {stats['latency_mean'] * 1000:.1f} ms, "
+              f"queue drops {stats['dropped']}")
+    runtime.add_shutdown('radio', close_radio, blocking=True)
+
+    # Encodes telemetry in the format negotiated with the ground station
+    codec = MessageCodec(boat_name, boat_id)
+
+    # Send registration message; it asks the ground station for keepalives, which
+    # keep the link watchdog fed while the operator holds a steady input
+    keepalive_period = config.get('keepalive_period', 0.2)
+    xbee_comm.send(codec.registration(keepalive_period), PRIORITY_CONTROL, acknowledged=False)
+
+    # Single periodic telemetry frame; it also serves as the heartbeat. JSON frames
+    # go out at the slower rate until the ground station selects binary framing.
+    telemetry_rate = config.get('telemetry_rate_hz', 1.0)
+    telemetry = TelemetryAggregator(codec, lambda frame: xbee_comm.send(frame, PRIORITY_TELEMETRY), telemetry_rate,
+                                    json_rate_hz=config.get('telemetry_json_rate_hz', 0.2))
+    telemetry.update_health(command_mode=command_mode)
+    runtime.periodic('telemetry', telemetry_rate, telemetry.send_due)
+
+    # Fused heading and dead-reckoned position from the IMU and the GPS
+    estimator = NavigationEstimator(declination=config.get('magnetic_declination', 0.0))
+    runtime.add_shutdown('estimator', lambda: print(f"Estimator stats: {estimator.get_stats()}"))
+
+    # Apparent wind for sail trim: absolute AS5600 on I2C, or an A/B quadrature vane
+    windvane = None
+    try:
+        if config.get('windvane_type') == 'as5600':
+            windvane = AS5600(config.get('windvane_i2c_bus', 1), offset=config.get('windvane_offset', 0.0))
+            # Polled by the loop; the I2C transfer itself runs on the executor
+            runtime.periodic('windvane', config.get('windvane_rate_hz', 50.0), windvane.poll, blocking=True)
+        elif config.get('windvane_type') == 'quadrature' and config.get('windvane_pins'):
+            # Decodes edge batches on its own reader thread
+            windvane = WindvaneEncoder(*config['windvane_pins'],
+                                       counts_per_rev=config.get('windvane_counts_per_rev', 1024))
+    except (ImportError, OSError) as e:
+        print(f"Windvane unavailable ({e}), sailing without sail trim")
+    if windvane is not None:
+        runtime.add_shutdown('windvane', windvane.cleanup, blocking=True)
+
+    # Waypoint list kept on the boat, so it keeps navigating through link dropouts
+    mission = Mission(config.get('mission_file') or MISSION_FILE,
+                      send_ack=lambda message: xbee_comm.send(codec.encode(message), PRIORITY_CONTROL),
+                      arrival_radius=config.get('arrival_radius', 5.0), executor=runtime.executor)
+    mission.load()
+
+    # Where the boat returns when the link stays down: configured, or the first GPS fix
+    home = config.get('home_position')
+
+    def on_arrival(latitude, longitude):
+        if mission.active:
+            target = mission.advance()
+            if target is not None:
+                controller.set_target(*target, arrival_radius=mission.arrival_radius)
+
+    # Fixed-rate steering towards the autonomous target
+    controller = NavigationController(estimator, servos, windvane,
+                                      rate_hz=config.get('navigation_rate_hz', 20.0),
+                                      arrival_radius=config.get('arrival_radius', 5.0),
+                                      on_arrival=on_arrival)
+    runtime.periodic('control', config.get('navigation_rate_hz', 20.0), controller.step)
+
+    def resume_mission(latitude, longitude):
+        # A mission that was running before a restart continues from where the boat is
+        nonlocal command_mode
+        target = mission.recover(latitude, longitude)
+        if target is not None:
+            command_mode = 'autonomous'
+            controller.set_target(*target, arrival_radius=mission.arrival_radius)
+            telemetry.update_health(command_mode=command_mode)
+            print(f"Resuming mission {mission.mission_id} at waypoint {mission.index}")
+
+    # GPS fixes go straight into the telemetry frame at the receiver's update rate
+    resume_pending = mission.active
+    def on_gps_fix(fix):
+        nonlocal resume_pending, home
+        estimator.update_gps(fix)
+        if fix.valid:
+            telemetry.update_location(fix.latitude, fix.longitude)
+            if home is None:
+                home = (fix.latitude, fix.longitude)
+            if resume_pending:
+                resume_pending = False
+                resume_mission(fix.latitude, fix.longitude)
+
+    gps = GPSReader(config.get('gps_port', '/dev/ttyS0'), config.get('gps_baud_rate', 9600),
+                    target_baud_rate=config.get('gps_target_baud_rate'),
+                    rate_hz=config.get('gps_rate_hz'))
+    gps.add_fix_callback(runtime.threadsafe(on_gps_fix))
+    try:
+        # Configuring the receiver waits for its acknowledgements, so it runs on the executor
+        await runtime.run_in_executor(gps.open)
+    except SerialException as e:
+        print(f"GPS unavailable ({e}), using simulated GPS data")
+
+        def simulate_gps():
+            # Generate random latitude and longitude within a reasonable range
+            simulated_latitude = random.uniform(37.8600, 37.8700)  # Example range near Berkeley, CA
+            simulated_longitude = random.uniform(-122.3200, -122.3100)
+            telemetry.update_location(simulated_latitude, simulated_longitude)
+        runtime.periodic('gps-simulation', 0.2, simulate_gps)  # New simulated fix every 5 seconds
+    else:
+        gps_reader = runtime.run_blocking('gps', gps.run)
+
+        async def stop_gps():
+            gps.stop_event.set()
+            await asyncio.wait([gps_reader], timeout=2.0)
+            gps.stop()
+        runtime.add_shutdown('gps', stop_gps)
+
+    # IMU samples drive the estimator at the IMU output rate
+    if config.get('imu_port'):
+        imu = open_wit_imu(config['imu_port'], config.get('imu_baud_rate', 115200),
+                           runtime.threadsafe(estimator.update_imu_sample), read_thread=False)
+        imu_reader = runtime.run_blocking('imu', imu.readDataTh, "imu-reader", 10)
+
+        async def stop_imu():
+            imu.stopEvent.set()
+            await asyncio.wait([imu_reader], timeout=2.0)
+            imu.closeDevice()
+        runtime.add_shutdown('imu', stop_imu)
+
+    def apply_manual(values):
+        nonlocal command_mode
+        command_mode = 'manual'
+        controller.clear_target()
+        mission.pause()
+        process_manual_mode(values, servos, esc)
+        telemetry.update_servos(*servos.get_angles())
+        telemetry.update_health(command_mode=command_mode)
+
+    def apply_autonomous(data):
+        nonlocal command_mode
+        command_mode = 'autonomous'
+        mission.pause()
+        target = process_autonomous_mode(data)
+        if target is not None:
+            controller.set_target(*target)
+        telemetry.update_health(command_mode=command_mode)
+
+    def apply_mission(message):
+        nonlocal command_mode
+        if message.get('type') != 'mission_start':
+            mission.handle_message(message)
+            return
+        target = mission.start(message.get('index', 0))
+        if target is None:
+            print("No mission stored")
+            return
+        command_mode = 'autonomous'
+        controller.set_target(*target, arrival_radius=mission.arrival_radius)
+        telemetry.update_health(command_mode=command_mode)
+
+    def on_link_lost(action):
+        nonlocal command_mode
+        print(f"Link lost: {action}")
+        telemetry.update_health(link=action)
+        if esc is not None:
+            esc.set_throttle(0)
+        if action == 'safe' and command_mode != 'autonomous':
+            # Center the rudder and luff the sail
+            controller.clear_target()
+            servos.set_rudder_angle(90)
+            servos.set_sail_angle(90)
+        elif action == 'return_home' and not mission.active:
+            # A running mission carries on by itself
+            if home is None:
+                print("No home position, cannot return home")
+                return
+            command_mode = 'autonomous'
+            controller.set_target(*home)
+            telemetry.update_health(command_mode=command_mode)
+
+    def on_link_restored(outage):
+        print(f"Link restored after {outage:.1f} s")
+        telemetry.update_health(link='up')
+
+    # Failsafe stages (seconds of silence -> action) after the last frame from the
+    # ground station (command or keepalive) or acknowledgement of our telemetry
+    stages = [(after, action) for action, after in config.get('link_failsafe', {}).items() if after is not None]
+    for after, action in stages:
+        # Keepalives are the only feed a steady operator input guarantees:
+        # commands stop while the stick is held still, and telemetry is only
+        # acknowledged with a ground_station_address. A deadline shorter than two
+        # keepalive periods fires on a single lost keepalive.
+        if after < 2 * keepalive_period:
+            print(f"Link failsafe '{action}' after {after} s may trigger between keepalives "
+                  f"({keepalive_period} s)")
+    watchdog = LinkWatchdog(stages, on_link_lost, on_link_restored)
+    xbee_comm.add_delivered_callback(lambda now: watchdog.feed('ack', now))
+
+    def check_keepalives():
+        # Without keepalives every pause in the operator's commands trips the failsafe
+        counts = watchdog.get_stats()['counts']
+        if not counts.get('keepalive'):
+            print(f"Warning: no keepalive from the ground station {KEEPALIVE_GRACE * keepalive_period:.1f} s "
+                  f"after registration ({sum(counts.values())} other frames heard); the link failsafe "
+                  f"will trigger on any pause in commands")
+    runtime.loop.call_later(KEEPALIVE_GRACE * keepalive_period, check_keepalives)
+
+    async def watch_link():
+        # Sleeps until the next failsafe deadline; a feed only moves the deadline
         while True:
-            try:
-                # Generate random latitude and longitude within a reasonable range
-                simulated_latitude = random.uniform(37.8600, 37.8700)  # Example range near Berkeley, CA
-                simulated_longitude = random.uniform(-122.3200, -122.3100)
-                gps_message = json.dumps({
-                    "type": "location_update",
-                    "boat_name": boat_name,
-                    "location": {
-                        "latitude": simulated_latitude,
-                        "longitude": simulated_longitude
-                    }
-                })
-                xbee_comm.send_data(gps_message)
-                print(f"Sent simulated GPS data: {gps_message}")
-            except Exception as e:
-                print(f"Error in gps_simulation_loop: {e}")
-            time.sleep(5)  # Send GPS data every 5 seconds
-
-
-    threading.Thread(target=gps_simulation_loop, daemon=True).start()
-
+            delay = watchdog.check()
+            if not watchdog.link_up():
+                delay = LINK_RESTORE_CHECK if delay is None else min(delay, LINK_RESTORE_CHECK)
+            await runtime.sleep('link-watchdog', 1.0 if delay is None else delay)
+    runtime.spawn('link-watchdog', watch_link())
+    runtime.add_shutdown('link-watchdog', lambda: print(f"Link stats: {watchdog.get_stats()}"))
+
+    def on_accept(now, source):
+        # Every frame addressed to the boat shows the ground station is there
+        watchdog.feed(source, now)
+        if esc is not None:
+            esc.keepalive(now)
+
+    # Decode, filter and coalesce incoming commands before they reach the actuators.
+    # A burst that arrives before the loop gets to apply_pending() collapses into one update.
+    command_ingest = CommandIngest(codec, apply_manual, apply_autonomous,
+                                   on_accept=on_accept,
+                                   on_pending=lambda: runtime.loop.call_soon(command_ingest.apply_pending))
+    for message_type in ('mission_begin', 'mission_chunk', 'mission_end', 'mission_start'):
+        command_ingest.add_handler(message_type, apply_mission)
+    runtime.add_shutdown('commands', lambda: print(f"Command stats: {command_ingest.get_stats()}"))
+
+    # Set up the XBee to receive data; frames are handed to the loop with their receive time
+    receiving = True
+    def on_frame(raw, receive_time):
+        if receiving:
+            command_ingest.on_frame(raw, receive_time)
+    receive_frame = runtime.threadsafe(on_frame)
     def data_receive_callback(xbee_message):
-        global command_mode, target_gps_latitude, target_gps_longitude
-
-        print("Received data: %s" % xbee_message.data.decode())
-        try:
-            # Decode the JSON message
-            data = json.loads(xbee_message.data.decode())
-
-            # Check if the message is intended for this boat
-            target_boat_name = data.get('boat_name')
-            if target_boat_name not in [boat_name, 'all']:
-                # Message is not for this boat
-                return
-
-            # Extract command mode with a fallback to 'manual'
-            command_mode = data.get('command_mode', 'manual')
-            print(f"Command Mode: {command_mode}")
-
-            if command_mode == 'manual':
-                # Process manual mode data
-                process_manual_mode(data, servos)
-            elif command_mode == 'autonomous':
-                # Process autonomous mode data
-                process_autonomous_mode(data)
-            else:
-                print(f"Unknown command mode: {command_mode}")
-
-        except (ValueError, json.JSONDecodeError) as e:
-            print(f"Error decoding data: {e}")
-            print("Invalid data received. Please send valid JSON.")
-
-    # Set up the XBee to receive data
+        receive_frame(xbee_message.data, time.monotonic())
     xbee_comm.add_data_received_callback(data_receive_callback)
 
-    print("Waiting for data...\n")
-
-    try:
-        while True:
-            if command_mode == 'manual':
-                # Manual mode logic (if any)
-                pass
-            elif command_mode == 'autonomous':
-                # Autonomous mode logic (if any)
-                pass
-            else:
-                print(f"Unknown command mode: {command_mode}")
+    def stop_receiving():
+        # First shutdown step: frames already handed to the loop are dropped too
+        nonlocal receiving
+        receiving = False
+        xbee_comm.remove_data_received_callback(data_receive_callback)
+    runtime.add_shutdown('receive', stop_receiving)
+
+    def report_status():
+        heading = estimator.get_state()["heading"]
+        if heading is not None:
+            telemetry.update_heading(round(heading, 1))
+
+        if command_mode == 'manual':
+            # Manual mode logic (if any)
+            pass
+        elif command_mode == 'autonomous':
+            # Report whether the control task keeps up
+            telemetry.update_health(nav_overruns=runtime.timing['control'].overruns)
+            telemetry.update_servos(*servos.get_angles())
+        else:
+            print(f"Unknown command mode: {command_mode}")
+    runtime.periodic('status', 1.0, report_status)
 
-            time.sleep(1)
-
-    except KeyboardInterrupt:
-        print("Stopping...")
+    print("Waiting for data...\n")
 
-    finally:
-        xbee_comm.close()
-        servos.cleanup()
+def main():
+    Runtime().run(setup)
 
-def process_manual_mode(data, servos):
+def process_manual_mode(values, servos, esc=None):
     try:
-        # Extract angles for rudder, sail, and throttle with defaults
-        rudder_angle = float(data.get('rudder_angle', 0))
-        sail_angle = float(data.get('sail_angle', 0))
-        throttle = float(data.get('throttle', 0))
+        # Only the channels present in the (coalesced) command are updated
+        rudder_angle = values.get('rudder_angle')
+        sail_angle = values.get('sail_angle')
+        throttle = values.get('throttle')
 
         # Print the received angles
         print(f"Rudder Angle: {rudder_angle}, Sail Angle: {sail_angle}, Throttle: {throttle}")
 
         # Move the servos
-        servos.set_rudder_angle(rudder_angle)
-        servos.set_sail_angle(sail_angle)
-        # Process throttle if needed
+        if rudder_angle is not None:
+            servos.set_rudder_angle(rudder_angle)
+        if sail_angle is not None:
+            servos.set_sail_angle(sail_angle)
+        if throttle is not None and esc is not None:
+            esc.set_throttle(throttle)
 
     except (ValueError, TypeError) as e:
         print(f"Error processing manual mode data: {e}")
 
 def process_autonomous_mode(data):
-    global target_gps_latitude, target_gps_longitude
+    # Returns the (latitude, longitude) target, or None if the command is malformed
     try:
-        # Extract target GPS coordinates with defaults
-        target_gps_latitude = float(data.get('target_gps_latitude', 0))
-        target_gps_longitude = float(data.get('target_gps_longitude', 0))
+        # A command without both coordinates keeps the current target
+        if data.get('target_gps_latitude') is None or data.get('target_gps_longitude') is None:
+            print("Autonomous command without target coordinates, keeping the current target")
+            return None
+        target_gps_latitude = float(data['target_gps_latitude'])
+        target_gps_longitude = float(data['target_gps_longitude'])
 
         # Print the received target coordinates
         print(f"Target GPS Latitude: {target_gps_latitude}, Target GPS Longitude: {target_gps_longitude}")
-
-        # Implement autonomous navigation logic here
+        return target_gps_latitude, target_gps_longitude
 
     except (ValueError, TypeError) as e:
         print(f"Error processing autonomous mode data: {e}")
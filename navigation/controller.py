@@ -0,0 +1,196 @@
+# navigation/controller.py
+
+import math
+import threading
+import time
+from collections import deque
+from navigation.estimator import wrap_180
+from navigation.geodesy import LocalFrame
+
+class RudderPID:
+    # Heading-error PID with the output limited to +/- limit degrees of rudder.
+    # Anti-windup: the integral is clamped and stops growing while the output is
+    # saturated in the direction the error pushes it.
+    def __init__(self, kp=1.2, ki=0.05, kd=0.3, limit=35.0, integral_limit=20.0):
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.limit = limit
+        self.integral_limit = integral_limit
+        self.integral = 0.0
+        self.previous_error = None
+
+    def reset(self):
+        self.integral = 0.0
+        self.previous_error = None
+
+    def update(self, error, dt):
+        derivative = 0.0
+        if self.previous_error is not None and dt > 0:
+            derivative = wrap_180(error - self.previous_error) / dt
+        self.previous_error = error
+
+        output = self.kp * error + self.ki * self.integral + self.kd * derivative
+        saturated = abs(output) >= self.limit and (output > 0) == (error > 0)
+        if not saturated:
+            self.integral += error * dt
+            self.integral = max(-self.integral_limit, min(self.integral_limit, self.integral))
+        return max(-self.limit, min(self.limit, output))
+
+def sail_trim(apparent_wind_angle, in_irons=30.0, sail_max=90.0):
+    # Sheet in close-hauled, ease out linearly towards a run. apparent_wind_angle
+    # is relative to the bow in degrees, either side.
+    angle = abs(wrap_180(apparent_wind_angle))
+    if angle <= in_irons:
+        return 0.0
+    return sail_max * (angle - in_irons) / (180.0 - in_irons)
+
+class NavigationController:
+    # Steers towards the target on a fixed-rate loop. Each step reads the estimator,
+    # runs the rudder PID on the heading error and trims the sail from the windvane.
+    # Servos are commanded through their scheduler, so a step never blocks on them.
+    def __init__(self, estimator, servos, windvane=None, rate_hz=20.0, rudder_center=90.0,
+                 arrival_radius=5.0, on_arrival=None):
+        self.estimator = estimator
+        self.servos = servos
+        self.windvane = windvane
+        self.period = 1.0 / rate_hz
+        self.rudder_center = rudder_center
+        self.arrival_radius = arrival_radius
+        self.on_arrival = on_arrival        # called with (latitude, longitude) of the reached target
+        self.pid = RudderPID()
+        self.deadband = 0.5                 # degrees, smaller changes are not sent to the servos
+
+        self.lock = threading.Lock()
+        self.target = None                  # (latitude, longitude)
+        self.frame = None                   # LocalFrame around the target, built once per target
+        self.target_radius = arrival_radius
+        self.active = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.rudder_command = None
+        self.sail_command = None
+        self.last_status = {}
+        self.last_step = None               # time.monotonic() of the previous step while steering
+
+        # Loop timing statistics
+        self.steps = 0
+        self.overruns = 0
+        self.errors = 0
+        self.jitter = deque(maxlen=1000)    # seconds late relative to the deadline
+        self.step_times = deque(maxlen=1000)
+
+    def set_target(self, latitude, longitude, arrival_radius=None):
+        with self.lock:
+            self.target_radius = arrival_radius if arrival_radius is not None else self.arrival_radius
+            if self.target != (latitude, longitude):
+                self.pid.reset()
+                self.frame = LocalFrame(latitude, longitude)
+            self.target = (latitude, longitude)
+        self.active.set()
+
+    def clear_target(self):
+        with self.lock:
+            self.target = None
+            self.frame = None
+        self.active.clear()
+
+    def start(self):
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="navigation", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.active.set()  # wake an idle loop
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def apparent_wind_angle(self):
+        if self.windvane is None:
+            return None
+        return self.windvane.get_angle()
+
+    def step(self, dt=None):
+        # dt defaults to the time since the previous step, so ticks skipped
+        # after an overrun still give the PID the right integral and derivative
+        now = time.monotonic()
+        with self.lock:
+            target, frame, radius = self.target, self.frame, self.target_radius
+        if target is None:
+            self.last_step = None
+            return
+        if dt is None:
+            dt = self.period if self.last_step is None else now - self.last_step
+        self.last_step = now
+        state = self.estimator.get_state()
+        if state["latitude"] is None or state["heading"] is None:
+            self._command(self.rudder_center, None)  # no estimate yet, hold the rudder straight
+            return
+
+        bearing, distance = frame.bearing_distance(state["latitude"], state["longitude"])
+        if distance <= radius:
+            self.clear_target()
+            self._command(self.rudder_center, None)
+            print(f"Arrived at target {target[0]:.6f}, {target[1]:.6f}")
+            if self.on_arrival is not None:
+                self.on_arrival(*target)
+            return
+
+        error = wrap_180(bearing - state["heading"])
+        rudder = self.rudder_center + self.pid.update(error, dt)
+        sail = None
+        wind = self.apparent_wind_angle()
+        if wind is not None:
+            sail = sail_trim(wind)
+        self._command(rudder, sail)
+        # Rudder lag: how long the servo still needs to reach the commanded angle
+        self.last_status = {"bearing": bearing, "distance": distance, "heading_error": error,
+                            "rudder_lag": self.servos.get_arrival_time("rudder")}
+
+    def _command(self, rudder, sail):
+        if self.rudder_command is None or abs(rudder - self.rudder_command) >= self.deadband:
+            self.servos.set_rudder_angle(rudder)
+            self.rudder_command = rudder
+        if sail is not None and (self.sail_command is None or abs(sail - self.sail_command) >= self.deadband):
+            self.servos.set_sail_angle(sail)
+            self.sail_command = sail
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            if not self.active.is_set():
+                self.active.wait()
+                continue
+            deadline = time.monotonic()
+            while self.active.is_set() and not self.stop_event.is_set():
+                wake = time.monotonic()
+                self.jitter.append(wake - deadline)
+                try:
+                    self.step()
+                except Exception as e:
+                    self.errors += 1
+                    print(f"Error in navigation step: {e}")
+                finished = time.monotonic()
+                self.step_times.append(finished - wake)
+                self.steps += 1
+                deadline += self.period
+                if finished > deadline:
+                    # Missed the next deadline; skip the lost ticks instead of bursting
+                    self.overruns += 1
+                    deadline += math.ceil((finished - deadline) / self.period) * self.period
+                self.stop_event.wait(deadline - time.monotonic())
+
+    def get_stats(self):
+        jitter = sorted(self.jitter)
+        step_times = list(self.step_times)
+        return {
+            "steps": self.steps,
+            "overruns": self.overruns,
+            "errors": self.errors,
+            "jitter_mean": sum(jitter) / len(jitter) if jitter else 0.0,
+            "jitter_p99": jitter[int(len(jitter) * 0.99)] if jitter else 0.0,
+            "jitter_max": jitter[-1] if jitter else 0.0,
+            "step_time_mean": sum(step_times) / len(step_times) if step_times else 0.0,
+            "step_time_max": max(step_times) if step_times else 0.0,
+        }
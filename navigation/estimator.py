@@ -0,0 +1,217 @@
+# navigation/estimator.py
+
+import math
+import threading
+import time
+import numpy as np
+from navigation.geodesy import LocalFrame
+
+KNOTS_TO_MS = 0.514444
+
+def wrap_180(angle):
+    return (angle + 180.0) % 360.0 - 180.0
+
+class NavigationEstimator:
+    # Fuses the IMU and the GPS into a filtered heading and a dead-reckoned position.
+    #
+    # Heading: complementary filter. The gyro yaw rate is integrated at the IMU rate
+    # and pulled towards the magnetometer heading with time constant heading_tau.
+    #
+    # Position: constant-velocity Kalman filter on [east, north, v_east, v_north] in
+    # metres around the first fix (a LocalFrame). It is predicted on every IMU sample
+    # and corrected with each GPS fix (position and SOG/COG velocity), so between
+    # fixes the position is extrapolated. All matrices are allocated once; the per-sample step only
+    # writes into them (the fix update does one 4x4 inversion at the GPS rate).
+    def __init__(self, heading_tau=2.0, accel_noise=0.5, uere=3.0, declination=0.0):
+        self.heading_tau = heading_tau    # seconds, larger trusts the gyro longer
+        self.accel_noise = accel_noise    # m/s^2, unmodelled acceleration (waves, gusts)
+        self.uere = uere                  # metres, GPS range error scaled by HDOP
+        self.declination = declination    # degrees, added to magnetic headings
+        self.lock = threading.Lock()
+
+        # Filter state and work buffers
+        self.x = np.zeros(4)
+        self.P = np.diag([1e4, 1e4, 25.0, 25.0])
+        self.F = np.eye(4)
+        self.FT = self.F.T                # view, follows F
+        self.Q = np.zeros((4, 4))
+        self.R = np.zeros((4, 4))
+        self.S = np.zeros((4, 4))
+        self.K = np.zeros((4, 4))
+        self.I = np.eye(4)
+        self.T1 = np.zeros((4, 4))
+        self.T2 = np.zeros((4, 4))
+        self.z = np.zeros(4)
+        self.y = np.zeros(4)
+        self.dx = np.zeros(4)
+
+        # Local east/north frame around the first fix
+        self.frame = None
+
+        self.heading = None               # degrees true, clockwise from north
+        self.yaw_rate = 0.0               # degrees/s, clockwise positive
+        self.time = None                  # time.monotonic() of the state
+        self.fix_time = None
+
+        # Statistics
+        self.imu_updates = 0
+        self.gps_updates = 0
+        self.step_time_total = 0.0
+        self.step_time_max = 0.0
+
+    def _advance(self, now):
+        # Propagate heading and state to now
+        if self.time is None:
+            self.time = now
+            return
+        dt = now - self.time
+        if dt <= 0:
+            return
+        self.time = now
+        if self.heading is not None:
+            self.heading = (self.heading + self.yaw_rate * dt) % 360.0
+        if self.frame is None:
+            return
+
+        F, P, Q, T1 = self.F, self.P, self.Q, self.T1
+        F[0, 2] = F[1, 3] = dt
+        np.matmul(F, self.x, out=self.dx)
+        self.x[:] = self.dx
+        np.matmul(F, P, out=T1)
+        np.matmul(T1, self.FT, out=P)
+        # White-noise acceleration
+        q = self.accel_noise * self.accel_noise
+        Q[0, 0] = Q[1, 1] = q * dt * dt * dt / 3.0
+        Q[0, 2] = Q[2, 0] = Q[1, 3] = Q[3, 1] = q * dt * dt / 2.0
+        Q[2, 2] = Q[3, 3] = q * dt
+        np.add(P, Q, out=P)
+
+    def update_imu(self, yaw_rate, mag_heading, host_time):
+        # yaw_rate in degrees/s and mag_heading in magnetic degrees, both clockwise
+        # positive; mag_heading may be None when only the gyro is available
+        start = time.perf_counter()
+        with self.lock:
+            previous = self.time
+            self._advance(host_time)
+            self.yaw_rate = yaw_rate
+            if mag_heading is not None:
+                mag_heading += self.declination
+                if self.heading is None:
+                    self.heading = mag_heading % 360.0
+                elif previous is not None and host_time > previous:
+                    dt = host_time - previous
+                    alpha = dt / (self.heading_tau + dt)
+                    self.heading = (self.heading + alpha * wrap_180(mag_heading - self.heading)) % 360.0
+            self.imu_updates += 1
+        elapsed = time.perf_counter() - start
+        self.step_time_total += elapsed
+        self.step_time_max = max(self.step_time_max, elapsed)
+
+    def update_imu_sample(self, sample):
+        # WIT angles and rates are counterclockwise positive around Z
+        if sample.gyroZ is None or sample.hostTime is None:
+            return
+        heading = -sample.angleZ if sample.angleZ is not None else None
+        self.update_imu(-sample.gyroZ, heading, sample.hostTime)
+
+    def update_gps(self, fix):
+        if not fix.valid or fix.latitude is None or fix.host_time is None:
+            return
+        with self.lock:
+            if self.frame is None:
+                self.frame = LocalFrame(fix.latitude, fix.longitude)
+            self._advance(fix.host_time)
+
+            z, R = self.z, self.R
+            z[0], z[1] = self.frame.to_local(fix.latitude, fix.longitude)
+            position_sigma = self.uere * (fix.hdop if fix.hdop else 2.0)
+            R[0, 0] = R[1, 1] = position_sigma * position_sigma
+            if fix.sog_knots is not None and fix.cog is not None:
+                speed = fix.sog_knots * KNOTS_TO_MS
+                course = math.radians(fix.cog)
+                z[2] = speed * math.sin(course)
+                z[3] = speed * math.cos(course)
+                R[2, 2] = R[3, 3] = 0.25
+                # Without an IMU the course is the best heading we have
+                if self.imu_updates == 0 and speed > 0.5:
+                    self.heading = fix.cog
+            else:
+                z[2] = z[3] = 0.0
+                R[2, 2] = R[3, 3] = 1e6     # velocity not measured
+
+            P, K, T1 = self.P, self.K, self.T1
+            np.add(P, R, out=self.S)
+            np.matmul(P, np.linalg.inv(self.S), out=K)
+            np.subtract(z, self.x, out=self.y)
+            np.matmul(K, self.y, out=self.dx)
+            np.add(self.x, self.dx, out=self.x)
+            np.subtract(self.I, K, out=T1)
+            np.matmul(T1, P, out=self.T2)
+            P[:] = self.T2
+            self.fix_time = fix.host_time
+            self.gps_updates += 1
+
+    def get_state(self, now=None):
+        # Snapshot of the estimate, extrapolated to now (time.monotonic())
+        with self.lock:
+            if now is None:
+                now = time.monotonic()
+            state = {"heading": self.heading, "latitude": None, "longitude": None,
+                     "speed": None, "course": None, "position_sigma": None, "fix_age": None}
+            if self.frame is None:
+                return state
+            dt = max(0.0, now - self.time)
+            east = self.x[0] + self.x[2] * dt
+            north = self.x[1] + self.x[3] * dt
+            state["latitude"], state["longitude"] = self.frame.to_geodetic(east, north)
+            state["east"], state["north"] = east, north
+            state["speed"] = math.hypot(self.x[2], self.x[3])
+            state["course"] = math.degrees(math.atan2(self.x[2], self.x[3])) % 360.0
+            state["position_sigma"] = math.sqrt(max(self.P[0, 0], self.P[1, 1]))
+            state["fix_age"] = now - self.fix_time
+            if self.heading is not None:
+                state["heading"] = (self.heading + self.yaw_rate * dt) % 360.0
+            return state
+
+    def get_stats(self):
+        return {
+            "imu_updates": self.imu_updates,
+            "gps_updates": self.gps_updates,
+            "step_time_mean": self.step_time_total / self.imu_updates if self.imu_updates else 0.0,
+            "step_time_max": self.step_time_max,
+        }
+
+if __name__ == '__main__':
+    # Simulated run: 200 Hz IMU, 5 Hz GPS, boat turning slowly at 2 m/s
+    import random
+    from types import SimpleNamespace
+
+    imu_rate, gps_rate, duration = 200, 5, 120.0
+    estimator = NavigationEstimator()
+    heading, east, north = 30.0, 0.0, 0.0
+    truth = LocalFrame(37.8650, -122.3150)
+    errors = []
+    steps = int(duration * imu_rate)
+    for step in range(steps):
+        t = step / imu_rate
+        yaw_rate = 3.0 * math.sin(t / 10.0)
+        heading = (heading + yaw_rate / imu_rate) % 360.0
+        east += 2.0 * math.sin(math.radians(heading)) / imu_rate
+        north += 2.0 * math.cos(math.radians(heading)) / imu_rate
+        estimator.update_imu(yaw_rate + random.gauss(0, 0.5), heading + random.gauss(0, 3.0), t)
+        if step % (imu_rate // gps_rate) == 0:
+            latitude, longitude = truth.to_geodetic(east + random.gauss(0, 2.0), north + random.gauss(0, 2.0))
+            fix = SimpleNamespace(valid=True, host_time=t, hdop=1.0, latitude=latitude, longitude=longitude,
+                                  sog_knots=2.0 / KNOTS_TO_MS + random.gauss(0, 0.1),
+                                  cog=heading + random.gauss(0, 2.0))
+            estimator.update_gps(fix)
+        if t > 10.0 and step % (imu_rate // gps_rate) == imu_rate // gps_rate // 2:
+            state = estimator.get_state(t)
+            errors.append((math.dist(truth.to_local(state["latitude"], state["longitude"]), (east, north)),
+                           abs(wrap_180(state["heading"] - heading))))
+
+    stats = estimator.get_stats()
+    print(f"IMU step: mean {stats['step_time_mean'] * 1e6:.1f} us, max {stats['step_time_max'] * 1e6:.1f} us, "
+          f"{stats['step_time_mean'] * imu_rate * 100:.2f}% of one core at {imu_rate} Hz")
+    print(f"Between fixes: mean position error {sum(e[0] for e in errors) / len(errors):.2f} m, "
+          f"mean heading error {sum(e[1] for e in errors) / len(errors):.2f} deg")
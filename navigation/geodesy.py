@@ -0,0 +1,103 @@
+# navigation/geodesy.py
+
+import math
+import numpy as np
+
+EARTH_RADIUS = 6371000.0  # metres, mean radius shared with haversine()
+
+def haversine(latitude, longitude, target_latitude, target_longitude):
+    # Exact great-circle initial bearing (degrees true) and distance (metres)
+    phi1, phi2 = math.radians(latitude), math.radians(target_latitude)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(target_longitude - longitude)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    distance = 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(a)))
+    y = math.sin(d_lambda) * math.cos(phi2)
+    x = math.cos(phi1) * math.sin(phi2) - math.sin(phi1) * math.cos(phi2) * math.cos(d_lambda)
+    return math.degrees(math.atan2(y, x)) % 360.0, distance
+
+class LocalFrame:
+    # East/north tangent plane around an origin (usually the current target).
+    # The origin's trig values are computed once; converting a position is then a
+    # handful of multiplies. cos(latitude) is expanded to second order around the
+    # origin, which keeps the error in the millimetre range over a few kilometres.
+    # Every method accepts scalars or NumPy arrays of positions.
+    def __init__(self, latitude, longitude):
+        self.latitude = latitude
+        self.longitude = longitude
+        phi0 = math.radians(latitude)
+        self.sin0 = math.sin(phi0)
+        self.cos0 = math.cos(phi0)
+        self.metres_per_radian = EARTH_RADIUS
+        self.north_scale = math.radians(1.0) * EARTH_RADIUS  # metres per degree of latitude
+
+    def _cos_latitude(self, d_phi):
+        return self.cos0 - self.sin0 * d_phi - 0.5 * self.cos0 * d_phi * d_phi
+
+    def to_local(self, latitude, longitude):
+        # Degrees to (east, north) metres from the origin
+        d_phi = np.radians(latitude - self.latitude) if isinstance(latitude, np.ndarray) \
+            else math.radians(latitude - self.latitude)
+        d_lambda = (longitude - self.longitude + 180.0) % 360.0 - 180.0
+        north = d_phi * self.metres_per_radian
+        # Mid-point latitude keeps east/west distances right away from the origin
+        east = d_lambda * self.north_scale * self._cos_latitude(0.5 * d_phi)
+        return east, north
+
+    def to_geodetic(self, east, north):
+        # (east, north) metres to degrees
+        d_phi = north / self.metres_per_radian
+        latitude = self.latitude + d_phi * (180.0 / math.pi)
+        longitude = self.longitude + east / (self.north_scale * self._cos_latitude(0.5 * d_phi))
+        return latitude, longitude
+
+    def to_local_batch(self, positions):
+        # (N, 2) array of [latitude, longitude] to an (N, 2) array of [east, north]
+        positions = np.asarray(positions, dtype=float)
+        east, north = self.to_local(positions[:, 0], positions[:, 1])
+        return np.column_stack((east, north))
+
+    def bearing_distance_to_origin(self, east, north):
+        # Bearing (degrees true) and distance (metres) from a local position to the origin
+        if isinstance(east, np.ndarray):
+            return np.degrees(np.arctan2(-east, -north)) % 360.0, np.hypot(east, north)
+        return math.degrees(math.atan2(-east, -north)) % 360.0, math.hypot(east, north)
+
+    def bearing_distance(self, latitude, longitude):
+        # Bearing and distance from a position to the origin, as haversine() would give them
+        return self.bearing_distance_to_origin(*self.to_local(latitude, longitude))
+
+if __name__ == '__main__':
+    # Accuracy against haversine over typical course distances
+    import time
+    rng = np.random.default_rng(1)
+    target = LocalFrame(37.8650, -122.3150)
+    for radius in (10.0, 100.0, 1000.0, 5000.0, 20000.0):
+        directions = rng.uniform(0, 2 * math.pi, 2000)
+        ranges = rng.uniform(0.5, 1.0, 2000) * radius
+        # Sample points around the target, then compare both methods from each point
+        latitudes = target.latitude + np.degrees(ranges * np.cos(directions) / EARTH_RADIUS)
+        longitudes = target.longitude + np.degrees(ranges * np.sin(directions) / EARTH_RADIUS) / target.cos0
+        bearings, distances = target.bearing_distance(latitudes, longitudes)
+        distance_error = bearing_error = 0.0
+        for latitude, longitude, bearing, distance in zip(latitudes, longitudes, bearings, distances):
+            exact_bearing, exact_distance = haversine(latitude, longitude, target.latitude, target.longitude)
+            distance_error = max(distance_error, abs(distance - exact_distance))
+            bearing_error = max(bearing_error, abs((bearing - exact_bearing + 180.0) % 360.0 - 180.0))
+        print(f"up to {radius:7.0f} m: max distance error {distance_error * 1000:8.3f} mm, "
+              f"max bearing error {bearing_error:.5f} deg")
+
+    # Cost per conversion, scalar and batched
+    count = 100000
+    start = time.perf_counter()
+    for _ in range(count):
+        target.bearing_distance(37.8700, -122.3100)
+    scalar = (time.perf_counter() - start) / count
+    start = time.perf_counter()
+    for _ in range(count):
+        haversine(37.8700, -122.3100, target.latitude, target.longitude)
+    exact = (time.perf_counter() - start) / count
+    start = time.perf_counter()
+    target.bearing_distance(latitudes, longitudes)
+    batch = (time.perf_counter() - start) / len(latitudes)
+    print(f"LocalFrame {scalar * 1e6:.2f} us, haversine {exact * 1e6:.2f} us, batched {batch * 1e9:.0f} ns per position")
@@ -0,0 +1,265 @@
+# navigation/mission.py
+
+import json
+import math
+import os
+import threading
+import zlib
+import numpy as np
+from comms.wire_format import POSITION
+from navigation.geodesy import LocalFrame
+
+MAX_WAYPOINTS = 1000
+
+def waypoint_crc32(waypoints, crc=0):
+    # CRC-32 over the waypoints packed like POSITION (int32 1e-7 degrees, little endian),
+    # so the ground station gets the same value whatever its float formatting
+    for latitude, longitude in waypoints:
+        crc = zlib.crc32(POSITION.pack(int(round(latitude * 1e7)), int(round(longitude * 1e7))), crc)
+    return crc
+
+class WaypointGrid:
+    # Uniform grid over the mission's local frame for nearest-waypoint queries.
+    # Only the cells in rings around the query point are searched, stopping once
+    # no closer waypoint can exist in the next ring.
+    def __init__(self, frame, waypoints, cell_size=50.0):
+        self.cell_size = cell_size
+        self.frame = frame
+        self.points = frame.to_local_batch(waypoints) if len(waypoints) else np.zeros((0, 2))
+        self.cells = {}
+        for index, (east, north) in enumerate(self.points):
+            self.cells.setdefault(self._cell(east, north), []).append(index)
+        if self.cells:
+            keys = np.array(list(self.cells))
+            self.max_ring = int(np.abs(keys).max()) + 1
+        else:
+            self.max_ring = 0
+
+    def _cell(self, east, north):
+        return int(math.floor(east / self.cell_size)), int(math.floor(north / self.cell_size))
+
+    def nearest(self, latitude, longitude):
+        # Index of the nearest waypoint and its distance in metres, (None, None) if empty
+        if not self.cells:
+            return None, None
+        east, north = self.frame.to_local(latitude, longitude)
+        cx, cy = self._cell(east, north)
+        best, best_distance = None, math.inf
+        ring = 0
+        limit = self.max_ring + max(abs(cx), abs(cy))
+        while ring <= limit:
+            for x in range(cx - ring, cx + ring + 1):
+                for y in (range(cy - ring, cy + ring + 1) if abs(x - cx) == ring else (cy - ring, cy + ring)):
+                    for index in self.cells.get((x, y), ()):
+                        distance = math.hypot(self.points[index, 0] - east, self.points[index, 1] - north)
+                        if distance < best_distance:
+                            best, best_distance = index, distance
+            # Anything in ring + 1 is at least ring * cell_size away
+            if best is not None and best_distance <= ring * self.cell_size:
+                break
+            ring += 1
+        return best, best_distance
+
+class Mission:
+    # Waypoint list uploaded in chunks from the ground station and kept on the boat.
+    #
+    # Upload protocol (JSON messages, acknowledged with 'mission_ack'):
+    #   mission_begin  {mission_id, count, chunks, crc32, arrival_radius?}
+    #   mission_chunk  {mission_id, seq, waypoints: [[lat, lon], ...], crc32}
+    #   mission_end    {mission_id}   -> ack lists missing chunks, or commits the mission
+    #   mission_start  {index?}       -> follow the stored mission
+    # CRCs are waypoint_crc32() over the chunk and over the whole list. Chunks may be
+    # repeated; a committed mission is written atomically together with its progress.
+    # With an executor the file is written there, so callers never wait on fsync.
+    def __init__(self, path, send_ack=None, arrival_radius=5.0, executor=None):
+        self.path = path
+        self.send_ack = send_ack            # called with each mission_ack message
+        self.default_arrival_radius = arrival_radius
+        self.executor = executor            # concurrent.futures.Executor for save(), None writes inline
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.save_sequence = 0              # snapshots taken
+        self.written_sequence = 0           # newest snapshot on disk
+
+        self.mission_id = None
+        self.waypoints = []                 # [(latitude, longitude), ...]
+        self.crc32 = None
+        self.arrival_radius = arrival_radius
+        self.index = 0                      # waypoint being sailed to
+        self.active = False                 # following the mission, survives a restart
+        self.grid = None
+        self.upload = None                  # upload in progress
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, 'r') as file:
+                data = json.load(file)
+            waypoints = [tuple(waypoint) for waypoint in data['waypoints']]
+            if waypoint_crc32(waypoints) != data['crc32']:
+                print(f"Stored mission {self.path} failed its checksum, ignoring it")
+                return False
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Error loading mission: {e}")
+            return False
+        with self.lock:
+            self._set_waypoints(data['mission_id'], waypoints, data['crc32'],
+                                data.get('arrival_radius', self.default_arrival_radius))
+            self.index = min(data.get('index', 0), len(waypoints))
+            self.active = data.get('active', False)
+        print(f"Loaded mission {self.mission_id}: {len(waypoints)} waypoints, at waypoint {self.index}")
+        return True
+
+    def save(self):
+        # Snapshot the state now; write it here or on the executor
+        with self.lock:
+            data = {"mission_id": self.mission_id, "crc32": self.crc32, "arrival_radius": self.arrival_radius,
+                    "waypoints": self.waypoints, "index": self.index, "active": self.active}
+            self.save_sequence += 1
+            sequence = self.save_sequence
+        if self.executor is None:
+            return self._write(data, sequence)
+        self.executor.submit(self._write, data, sequence)
+        return True
+
+    def _write(self, data, sequence):
+        # Write to a temporary file and rename it over the old one, so a power cut
+        # leaves either the old or the new mission on disk, never a partial one
+        with self.write_lock:
+            if sequence < self.written_sequence:
+                return True     # a newer snapshot is already on disk
+            temporary = self.path + '.tmp'
+            try:
+                with open(temporary, 'w') as file:
+                    json.dump(data, file)
+                    file.flush()
+                    os.fsync(file.fileno())
+                os.replace(temporary, self.path)
+            except OSError as e:
+                print(f"Error saving mission: {e}")
+                return False
+            self.written_sequence = sequence
+        return True
+
+    def _set_waypoints(self, mission_id, waypoints, crc32, arrival_radius):
+        self.mission_id = mission_id
+        self.waypoints = waypoints
+        self.crc32 = crc32
+        self.arrival_radius = arrival_radius
+        self.index = 0
+        self.grid = WaypointGrid(LocalFrame(*waypoints[0]), waypoints) if waypoints else None
+
+    def _ack(self, mission_id, seq, status, **extra):
+        if self.send_ack is not None:
+            self.send_ack({"type": "mission_ack", "mission_id": mission_id, "seq": seq, "status": status, **extra})
+
+    def handle_message(self, message):
+        # Entry point for every mission_* message
+        handlers = {
+            'mission_begin': self._begin,
+            'mission_chunk': self._chunk,
+            'mission_end': self._end,
+        }
+        handler = handlers.get(message.get('type'))
+        if handler is None:
+            return
+        try:
+            handler(message)
+        except (KeyError, ValueError, TypeError) as e:
+            print(f"Invalid mission message: {e}")
+            self._ack(message.get('mission_id'), message.get('seq'), 'error', reason=str(e))
+
+    def _begin(self, message):
+        count, chunks = int(message['count']), int(message['chunks'])
+        if not 0 < count <= MAX_WAYPOINTS or not 0 < chunks <= count:
+            raise ValueError(f"mission of {count} waypoints in {chunks} chunks")
+        self.upload = {"mission_id": message['mission_id'], "count": count, "chunks": chunks,
+                       "crc32": int(message['crc32']), "received": {},
+                       "arrival_radius": float(message.get('arrival_radius', self.default_arrival_radius))}
+        self._ack(message['mission_id'], 'begin', 'ok')
+
+    def _chunk(self, message):
+        upload = self.upload
+        if upload is None or upload['mission_id'] != message['mission_id']:
+            self._ack(message['mission_id'], message.get('seq'), 'error', reason='no upload in progress')
+            return
+        seq = int(message['seq'])
+        waypoints = [(float(latitude), float(longitude)) for latitude, longitude in message['waypoints']]
+        if not 0 <= seq < upload['chunks'] or waypoint_crc32(waypoints) != int(message['crc32']):
+            self._ack(message['mission_id'], seq, 'retry')
+            return
+        upload['received'][seq] = waypoints   # repeated chunks just overwrite
+        self._ack(message['mission_id'], seq, 'ok')
+
+    def _end(self, message):
+        upload = self.upload
+        if upload is None or upload['mission_id'] != message['mission_id']:
+            self._ack(message['mission_id'], 'end', 'error', reason='no upload in progress')
+            return
+        missing = [seq for seq in range(upload['chunks']) if seq not in upload['received']]
+        if missing:
+            self._ack(message['mission_id'], 'end', 'incomplete', missing=missing)
+            return
+        waypoints = [waypoint for seq in range(upload['chunks']) for waypoint in upload['received'][seq]]
+        if len(waypoints) != upload['count'] or waypoint_crc32(waypoints) != upload['crc32']:
+            self.upload = None
+            self._ack(message['mission_id'], 'end', 'error', reason='checksum mismatch')
+            return
+        with self.lock:
+            self._set_waypoints(upload['mission_id'], waypoints, upload['crc32'], upload['arrival_radius'])
+            self.active = False
+        self.upload = None
+        self.save()
+        print(f"Mission {self.mission_id} stored: {len(waypoints)} waypoints")
+        self._ack(message['mission_id'], 'end', 'ok', count=len(waypoints))
+
+    def current_target(self):
+        with self.lock:
+            if self.index < len(self.waypoints):
+                return self.waypoints[self.index]
+            return None
+
+    def start(self, index=0):
+        with self.lock:
+            if not self.waypoints:
+                return None
+            self.index = max(0, min(int(index), len(self.waypoints) - 1))
+            self.active = True
+        self.save()
+        return self.current_target()
+
+    def pause(self):
+        if self.active:
+            with self.lock:
+                self.active = False
+            self.save()
+
+    def advance(self):
+        # Current waypoint reached; returns the next target, or None when finished
+        with self.lock:
+            self.index += 1
+            if self.index >= len(self.waypoints):
+                self.active = False
+        self.save()
+        target = self.current_target()
+        if target is None:
+            print(f"Mission {self.mission_id} complete")
+        return target
+
+    def recover(self, latitude, longitude):
+        # After a reset: continue from the nearest waypoint, or from the one after it
+        # when the boat is already past the nearest one along its leg
+        with self.lock:
+            if self.grid is None:
+                return None
+            nearest, _ = self.grid.nearest(latitude, longitude)
+            if nearest + 1 < len(self.waypoints):
+                points = self.grid.points
+                leg = points[nearest + 1] - points[nearest]
+                east, north = self.grid.frame.to_local(latitude, longitude)
+                if (east - points[nearest, 0]) * leg[0] + (north - points[nearest, 1]) * leg[1] > 0:
+                    nearest += 1
+            self.index = max(self.index, nearest)  # never go back past stored progress
+        self.save()
+        return self.current_target()
@@ -0,0 +1,187 @@
+# sensors/as5600_i2c.py
+
+import math
+import threading
+import time
+import numpy as np
+
+AS5600_ADDRESS = 0x36
+
+# Registers
+REG_STATUS = 0x0B
+REG_RAW_ANGLE = 0x0C    # 12 bits, high byte first
+REG_ANGLE = 0x0E        # 12 bits, scaled by ZPOS/MPOS, high byte first
+
+# STATUS bits
+STATUS_MH = 0x08        # magnet too strong
+STATUS_ML = 0x10        # magnet too weak
+STATUS_MD = 0x20        # magnet detected
+
+COUNTS_PER_REV = 4096
+
+class FakeI2CBus:
+    # Stands in for smbus2.SMBus: a register file the driver can burst-read,
+    # with the angle and magnet status set by the caller
+    def __init__(self, angle=0.0, status=STATUS_MD):
+        self.registers = bytearray(256)
+        self.transactions = 0
+        self.set_status(status)
+        self.set_angle(angle)
+
+    def set_angle(self, angle):
+        counts = int(round(angle % 360.0 * COUNTS_PER_REV / 360.0)) % COUNTS_PER_REV
+        for register in (REG_RAW_ANGLE, REG_ANGLE):
+            self.registers[register] = counts >> 8
+            self.registers[register + 1] = counts & 0xFF
+
+    def set_status(self, status):
+        self.registers[REG_STATUS] = status
+
+    def read_i2c_block_data(self, address, register, length):
+        self.transactions += 1
+        return list(self.registers[register:register + length])
+
+    def close(self):
+        pass
+
+class AS5600:
+    # Absolute magnetic angle sensor on I2C. STATUS, RAW ANGLE and ANGLE are read
+    # in one 5-byte burst from 0x0B, so status and angle always belong together.
+    # A polling thread keeps a circular mean over the last average_count samples.
+    def __init__(self, bus=1, address=AS5600_ADDRESS, rate_hz=50.0, average_count=25, offset=0.0):
+        if isinstance(bus, int):
+            from smbus2 import SMBus
+            bus = SMBus(bus)
+        self.bus = bus
+        self.address = address
+        self.period = 1.0 / rate_hz
+        self.offset = offset                # degrees, sensor reading when the vane points at the bow
+
+        # Unit vectors of the recent samples and their running sums
+        self.average_count = average_count
+        self.cos_window = np.zeros(average_count)
+        self.sin_window = np.zeros(average_count)
+        self.window_index = 0
+        self.window_fill = 0
+        self.cos_sum = 0.0
+        self.sin_sum = 0.0
+
+        self.lock = threading.Lock()
+        self.raw_angle = None
+        self.angle = None
+        self.status = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+        # Statistics
+        self.reads = 0
+        self.read_errors = 0
+        self.magnet_errors = 0
+
+    def read(self):
+        # One burst transaction; returns (status, raw angle, angle) with angles in degrees
+        data = self.bus.read_i2c_block_data(self.address, REG_STATUS, 5)
+        raw = ((data[1] & 0x0F) << 8) | data[2]
+        angle = ((data[3] & 0x0F) << 8) | data[4]
+        return data[0], raw * 360.0 / COUNTS_PER_REV, angle * 360.0 / COUNTS_PER_REV
+
+    def magnet_status(self):
+        status = self.status
+        return {
+            "detected": bool(status & STATUS_MD),
+            "too_weak": bool(status & STATUS_ML),
+            "too_strong": bool(status & STATUS_MH),
+        }
+
+    def poll(self):
+        try:
+            status, raw_angle, angle = self.read()
+        except OSError as e:
+            self.read_errors += 1
+            if self.read_errors == 1:
+                print(f"AS5600 read failed: {e}")
+            return
+        self.reads += 1
+        with self.lock:
+            self.status = status
+            self.raw_angle = raw_angle
+            self.angle = angle
+            if not status & STATUS_MD or status & (STATUS_ML | STATUS_MH):
+                self.magnet_errors += 1
+                return  # angle is unreliable, keep it out of the average
+            radians = math.radians(angle - self.offset)
+            index = self.window_index
+            cos_value, sin_value = math.cos(radians), math.sin(radians)
+            self.cos_sum += cos_value - self.cos_window[index]
+            self.sin_sum += sin_value - self.sin_window[index]
+            self.cos_window[index] = cos_value
+            self.sin_window[index] = sin_value
+            self.window_index = (index + 1) % self.average_count
+            self.window_fill = min(self.window_fill + 1, self.average_count)
+            if self.window_index == 0:
+                # Resum once per window so rounding errors cannot accumulate
+                self.cos_sum = float(self.cos_window.sum())
+                self.sin_sum = float(self.sin_window.sum())
+
+    def get_angle(self):
+        # Averaged wind angle in degrees relative to the bow, None before the first good sample
+        with self.lock:
+            if self.window_fill == 0:
+                return None
+            return math.degrees(math.atan2(self.sin_sum, self.cos_sum)) % 360.0
+
+    def get_raw_angle(self):
+        return self.raw_angle
+
+    def start(self):
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="as5600", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def cleanup(self):
+        self.stop()
+        self.bus.close()
+
+    def get_stats(self):
+        return {
+            "reads": self.reads,
+            "read_errors": self.read_errors,
+            "magnet_errors": self.magnet_errors,
+            **self.magnet_status(),
+        }
+
+    def _run(self):
+        next_poll = time.monotonic()
+        while not self.stop_event.is_set():
+            self.poll()
+            next_poll += self.period
+            now = time.monotonic()
+            if next_poll < now:
+                next_poll = now
+            self.stop_event.wait(next_poll - now)
+
+if __name__ == '__main__':
+    # Reads the sensor on I2C bus 1, or a fake vane swinging around 350 degrees
+    try:
+        sensor = AS5600(1)
+        sensor.read()
+    except (ImportError, OSError) as e:
+        print(f"No AS5600 on I2C bus 1 ({e}), using a fake bus")
+        bus = FakeI2CBus()
+        sensor = AS5600(bus)
+    else:
+        bus = None
+    sensor.start()
+    for step in range(20):
+        if bus is not None:
+            bus.set_angle(350.0 + 20.0 * math.sin(step))
+        time.sleep(0.1)
+        print(f"raw {sensor.get_raw_angle():7.2f}  averaged {sensor.get_angle():7.2f}  {sensor.magnet_status()}")
+    sensor.cleanup()
+    print(sensor.get_stats())
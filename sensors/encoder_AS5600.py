@@ -1,30 +1,54 @@
 # encoder.py
 
-import RPi.GPIO as GPIO
+import threading
+from sensors.quadrature import QuadratureDecoder, open_edge_source
 
 class WindvaneEncoder:
-    def __init__(self, pin_a, pin_b):
+    # Incremental A/B windvane. Edges are collected by an edge source (pigpio's
+    # sample buffer when available) and decoded in batches on a reader thread.
+    def __init__(self, pin_a, pin_b, counts_per_rev=1024, source=None, batch_period=0.02):
         self.pin_a = pin_a
         self.pin_b = pin_b
-        self.position = 0
+        self.source = source if source is not None else open_edge_source(pin_a, pin_b)
+        self.decoder = QuadratureDecoder(counts_per_rev, initial_state=self.source.initial_state)
+        self.batch_period = batch_period
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="windvane", daemon=True)
+        self.thread.start()
 
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setup(self.pin_a, GPIO.IN)
-        GPIO.setup(self.pin_b, GPIO.IN)
+    def _run(self):
+        while not self.stop_event.is_set():
+            ticks, states, missed = self.source.read(self.batch_period)
+            with self.lock:
+                self.decoder.missed_reports += missed
+                if ticks is None:
+                    self.decoder.idle(self.source.now())
+                else:
+                    self.decoder.process(ticks, states)
 
-        GPIO.add_event_detect(self.pin_a, GPIO.BOTH, callback=self._update)
-        GPIO.add_event_detect(self.pin_b, GPIO.BOTH, callback=self._update)
+    def get_position(self):
+        return self.decoder.position
 
-    def _update(self, channel):
-        a = GPIO.input(self.pin_a)
-        b = GPIO.input(self.pin_b)
-        if a == b:
-            self.position += 1
-        else:
-            self.position -= 1
+    def get_angle(self):
+        # Filtered apparent wind angle in degrees, relative to the start position
+        with self.lock:
+            return self.decoder.get_filtered_angle()
 
-    def get_position(self):
-        return self.position
+    def get_rate(self):
+        # Filtered vane rate in degrees per second
+        return self.decoder.get_rate()
+
+    def get_stats(self):
+        decoder = self.decoder
+        return {
+            "edges": decoder.edges,
+            "errors": decoder.errors,
+            "missed_reports": decoder.missed_reports,
+            "rate": decoder.get_rate(),
+        }
 
     def cleanup(self):
-        GPIO.cleanup([self.pin_a, self.pin_b])
+        self.stop_event.set()
+        self.thread.join()
+        self.source.close()
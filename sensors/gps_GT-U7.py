@@ -1,49 +1,37 @@
 import serial
 import time
+from gps_reader import GPSReader
 
 # Define the serial port and the baud rate
 serial_port = '/dev/ttyS0'  # Replace with the correct port if different
 baud_rate = 9600
-gps = None  # Initialize gps as None for error handling
 
-try:
-    # Initialize the serial connection
-    gps = serial.Serial(serial_port, baud_rate, timeout=1)
-    print("GPS module connected on /dev/ttyS0")
-
-    while True:
-        try:
-            if gps.in_waiting > 0:  # Check if there's data to read
-                data = gps.readline().decode('utf-8', errors='ignore').strip()  # Read a line and decode
-
-                if data.startswith('$GPGGA'):
-                    parts = data.split(',')
-                    fix_quality = parts[6]
+# Switched to at startup, with a faster navigation rate
+target_baud_rate = 115200
+rate_hz = 5
 
-                    # Only print if fix quality is greater than 0 (indicating a valid GPS fix)
-                    if fix_quality != '0':
-                        time_stamp = parts[1]
-                        latitude = parts[2]
-                        latitude_direction = parts[3]
-                        longitude = parts[4]
-                        longitude_direction = parts[5]
-                        num_satellites = parts[7]
+def print_fix(fix):
+    # Only print if the receiver reports a valid GPS fix
+    if fix.valid:
+        print(f"Time: {fix.fix_time}, Latitude: {fix.latitude:.7f}, Longitude: {fix.longitude:.7f}, "
+              f"SOG: {fix.sog_knots} kn, COG: {fix.cog}, HDOP: {fix.hdop}, "
+              f"Fix Quality: {fix.fix_quality}, Satellites: {fix.satellites}")
+    else:
+        print("No GPS fix yet.")
 
-                        # Display parsed data
-                        print(f"Time: {time_stamp}, Latitude: {latitude} {latitude_direction}, "
-                              f"Longitude: {longitude} {longitude_direction}, Fix Quality: {fix_quality}, "
-                              f"Satellites: {num_satellites}")
-                    else:
-                        print("No GPS fix yet.")
+gps = GPSReader(serial_port, baud_rate, target_baud_rate=target_baud_rate, rate_hz=rate_hz)
+gps.add_fix_callback(print_fix)
 
-        except serial.SerialException as e:
-            print(f"Serial exception: {e}")
-            break  # Break the loop if serial error occurs
-
-        time.sleep(0.5)  # Pause briefly to read incoming data
+try:
+    # Start reading in the background
+    gps.start()
+    print(f"GPS module connected on {serial_port}")
+    while True:
+        time.sleep(1)
 
 except serial.SerialException as e:
     print(f"Error opening serial port: {e}")
+except KeyboardInterrupt:
+    print("Stopping...")
 finally:
-    if gps:  # Only close if gps was successfully opened
-        gps.close()
+    gps.stop()
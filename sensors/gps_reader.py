@@ -0,0 +1,330 @@
+# gps_reader.py
+
+import struct
+import threading
+import time
+import serial
+
+# u-blox UBX protocol
+UBX_SYNC = b'\xb5\x62'
+UBX_CLASS_ACK = 0x05
+UBX_ACK_NAK = 0x00
+UBX_ACK_ACK = 0x01
+UBX_CLASS_CFG = 0x06
+UBX_CFG_PRT = 0x00
+UBX_CFG_MSG = 0x01
+UBX_CFG_RATE = 0x08
+
+# Message ids of the standard NMEA sentences (class 0xF0)
+NMEA_MESSAGE_IDS = {'GGA': 0x00, 'GLL': 0x01, 'GSA': 0x02, 'GSV': 0x03, 'RMC': 0x04, 'VTG': 0x05}
+
+class GpsFix:
+    # One position fix. Published fixes are never modified, so readers can keep
+    # a reference without locking.
+    __slots__ = ('valid', 'latitude', 'longitude', 'altitude', 'sog_knots', 'cog',
+                 'hdop', 'fix_quality', 'fix_type', 'satellites', 'fix_time', 'host_time')
+
+    def __init__(self):
+        self.valid = False        # receiver reports a usable position
+        self.latitude = None      # decimal degrees, north positive
+        self.longitude = None     # decimal degrees, east positive
+        self.altitude = None      # metres above mean sea level
+        self.sog_knots = None     # speed over ground
+        self.cog = None           # course over ground, degrees true
+        self.hdop = None
+        self.fix_quality = 0      # GGA quality, 0 = no fix
+        self.fix_type = 1         # GSA fix type: 1 = none, 2 = 2D, 3 = 3D
+        self.satellites = 0
+        self.fix_time = None      # UTC time of the fix as 'hhmmss.ss'
+        self.host_time = None     # time.monotonic() when the sentence was received
+
+    def copy(self):
+        fix = GpsFix.__new__(GpsFix)
+        for name in GpsFix.__slots__:
+            setattr(fix, name, getattr(self, name))
+        return fix
+
+def nmea_checksum_ok(sentence):
+    # sentence without line ending, e.g. '$GPGGA,...*47'
+    star = sentence.rfind('*')
+    if not sentence.startswith('$') or star < 0 or len(sentence) < star + 3:
+        return False
+    checksum = 0
+    for char in sentence[1:star]:
+        checksum ^= ord(char)
+    try:
+        return checksum == int(sentence[star + 1:star + 3], 16)
+    except ValueError:
+        return False
+
+def nmea_to_degrees(value, hemisphere):
+    # ddmm.mmmm / dddmm.mmmm to signed decimal degrees
+    if not value:
+        return None
+    raw = float(value)
+    degrees = int(raw // 100)
+    result = degrees + (raw - degrees * 100) / 60.0
+    return -result if hemisphere in ('S', 'W') else result
+
+def _float(value):
+    return float(value) if value else None
+
+def ubx_packet(message_class, message_id, payload=b''):
+    body = struct.pack('<BBH', message_class, message_id, len(payload)) + payload
+    ck_a = ck_b = 0
+    for byte in body:  # 8-bit Fletcher checksum
+        ck_a = (ck_a + byte) & 0xFF
+        ck_b = (ck_b + ck_a) & 0xFF
+    return UBX_SYNC + body + bytes((ck_a, ck_b))
+
+def ubx_cfg_prt(baud_rate):
+    # UART1, 8N1, UBX+NMEA in, UBX+NMEA out
+    payload = struct.pack('<BBHIIHHHH', 1, 0, 0, 0x000008D0, baud_rate, 0x0003, 0x0003, 0, 0)
+    return ubx_packet(UBX_CLASS_CFG, UBX_CFG_PRT, payload)
+
+def ubx_cfg_rate(measurement_ms):
+    # one navigation solution per measurement, aligned to GPS time
+    return ubx_packet(UBX_CLASS_CFG, UBX_CFG_RATE, struct.pack('<HHH', measurement_ms, 1, 1))
+
+def ubx_cfg_msg(sentence, rate):
+    # rate 0 turns the NMEA sentence off on the current port
+    return ubx_packet(UBX_CLASS_CFG, UBX_CFG_MSG, struct.pack('<BBB', 0xF0, NMEA_MESSAGE_IDS[sentence], rate))
+
+def find_ubx_ack(data, message_class, message_id):
+    # Returns True for ACK-ACK, False for ACK-NAK, None if no answer is in data
+    start = data.find(UBX_SYNC)
+    while start >= 0 and len(data) >= start + 10:
+        packet = data[start:start + 10]
+        if packet[2] == UBX_CLASS_ACK and packet[3] in (UBX_ACK_NAK, UBX_ACK_ACK) \
+                and packet[6] == message_class and packet[7] == message_id \
+                and ubx_packet(packet[2], packet[3], packet[6:8]) == packet:
+            return packet[3] == UBX_ACK_ACK
+        start = data.find(UBX_SYNC, start + 2)
+    return None
+
+class NmeaParser:
+    # Turns NMEA sentences into GpsFix updates. RMC and GGA carry a position and
+    # publish a new fix; VTG and GSA update speed/course and dilution for the next one.
+    def __init__(self):
+        self.fix = GpsFix()
+        self.handlers = {
+            'RMC': self._rmc,
+            'GGA': self._gga,
+            'VTG': self._vtg,
+            'GSA': self._gsa,
+        }
+        self.sentences = 0
+        self.checksum_errors = 0
+        self.parse_errors = 0       # valid checksum, malformed fields
+
+    def parse(self, sentence, host_time):
+        # Returns True when the sentence updated the position
+        if not nmea_checksum_ok(sentence):
+            self.checksum_errors += 1
+            return False
+        fields = sentence[1:sentence.rfind('*')].split(',')
+        handler = self.handlers.get(fields[0][-3:])  # any talker: GP, GN, GL...
+        if handler is None:
+            return False
+        self.sentences += 1
+        try:
+            return handler(fields, host_time)
+        except (ValueError, IndexError):
+            self.parse_errors += 1
+            return False
+
+    def _rmc(self, fields, host_time):
+        # $--RMC,time,status,lat,N,lon,E,sog,cog,date,...
+        fix = self.fix
+        fix.fix_time = fields[1]
+        fix.valid = fields[2] == 'A'
+        if fix.valid:
+            fix.latitude = nmea_to_degrees(fields[3], fields[4])
+            fix.longitude = nmea_to_degrees(fields[5], fields[6])
+        fix.sog_knots = _float(fields[7])
+        fix.cog = _float(fields[8])
+        fix.host_time = host_time
+        return True
+
+    def _gga(self, fields, host_time):
+        # $--GGA,time,lat,N,lon,E,quality,satellites,hdop,altitude,M,...
+        fix = self.fix
+        fix.fix_time = fields[1]
+        fix.fix_quality = int(fields[6] or 0)
+        fix.valid = fix.fix_quality > 0
+        if fix.valid:
+            fix.latitude = nmea_to_degrees(fields[2], fields[3])
+            fix.longitude = nmea_to_degrees(fields[4], fields[5])
+            fix.altitude = _float(fields[9])
+        fix.satellites = int(fields[7] or 0)
+        fix.hdop = _float(fields[8])
+        fix.host_time = host_time
+        return True
+
+    def _vtg(self, fields, host_time):
+        # $--VTG,cog true,T,cog magnetic,M,sog knots,N,sog km/h,K,...
+        self.fix.cog = _float(fields[1])
+        self.fix.sog_knots = _float(fields[5])
+        return False
+
+    def _gsa(self, fields, host_time):
+        # $--GSA,mode,fix type,12 satellite ids,pdop,hdop,vdop
+        self.fix.fix_type = int(fields[2] or 1)
+        self.fix.hdop = _float(fields[16])
+        return False
+
+class GPSReader:
+    # Reads the GT-U7 continuously on its own thread and publishes a GpsFix for
+    # every position sentence, so fixes are available at the receiver's update rate.
+    def __init__(self, port='/dev/ttyS0', baud_rate=9600, serial_port=None,
+                 target_baud_rate=None, rate_hz=None, disabled_sentences=('GLL', 'GSV', 'VTG')):
+        self.port = port
+        self.baud_rate = baud_rate
+        self.serial_port = serial_port  # any object with read()/in_waiting, e.g. a replay port
+        # Receiver configuration sent at start(), None leaves the setting alone
+        self.target_baud_rate = target_baud_rate
+        self.rate_hz = rate_hz
+        self.disabled_sentences = disabled_sentences
+        self.parser = NmeaParser()
+        self.latest_fix = GpsFix()
+        self.callbacks = []
+        self.fixes = 0
+        self.callback_errors = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def add_fix_callback(self, callback):
+        self.callbacks.append(callback)
+
+    def get_fix(self):
+        return self.latest_fix
+
+    def open(self):
+        if self.serial_port is None:
+            self.serial_port = serial.Serial(self.port, self.baud_rate, timeout=0.5)
+            if self.target_baud_rate or self.rate_hz or self.disabled_sentences:
+                self.configure()
+        self.stop_event.clear()
+
+    def start(self):
+        # Reader on its own thread; or call open() and run run() on an executor
+        self.open()
+        self.thread = threading.Thread(target=self.run, name="gps-reader", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.serial_port is not None:
+            self.serial_port.close()
+
+    def send_ubx(self, packet, timeout=1.0):
+        # Write a CFG packet and wait for its acknowledgement while NMEA keeps flowing
+        self.serial_port.reset_input_buffer()
+        self.serial_port.write(packet)
+        deadline = time.monotonic() + timeout
+        data = b''
+        while time.monotonic() < deadline:
+            data += self.serial_port.read(max(1, self.serial_port.in_waiting))
+            ack = find_ubx_ack(data, packet[2], packet[3])
+            if ack is not None:
+                return ack
+        return None
+
+    def probe(self, baud_rate, timeout=1.5):
+        # True if the receiver talks at baud_rate: a valid NMEA sentence or an
+        # answer to a UBX poll arrives within timeout
+        self.serial_port.baudrate = baud_rate
+        self.serial_port.reset_input_buffer()
+        self.serial_port.write(ubx_packet(UBX_CLASS_CFG, UBX_CFG_PRT, b'\x01'))
+        deadline = time.monotonic() + timeout
+        data = b''
+        while time.monotonic() < deadline:
+            data += self.serial_port.read(max(1, self.serial_port.in_waiting))
+            if find_ubx_ack(data, UBX_CLASS_CFG, UBX_CFG_PRT) is not None:
+                return True
+            *lines, _ = data.split(b'\n')
+            if any(nmea_checksum_ok(line.decode('ascii', errors='ignore').strip()) for line in lines):
+                return True
+        return False
+
+    def detect_baud_rate(self):
+        # The receiver stays powered across Pi restarts and may still run at the
+        # baud rate the previous run switched it to, so try both
+        candidates = [self.baud_rate]
+        if self.target_baud_rate and self.target_baud_rate != self.baud_rate:
+            candidates.append(self.target_baud_rate)
+        for baud_rate in candidates:
+            if self.probe(baud_rate):
+                self.baud_rate = baud_rate
+                return True
+        print(f"GPS silent at {' and '.join(str(baud_rate) for baud_rate in candidates)} baud")
+        self.serial_port.baudrate = self.baud_rate
+        return False
+
+    def configure(self):
+        # Best effort: every step is verified and a failed step leaves the receiver
+        # at its previous (working) setting. Settings are not saved on the receiver,
+        # so they are sent again on every start, after finding the receiver's baud rate.
+        self.detect_baud_rate()
+        for sentence in self.disabled_sentences or ():
+            if not self.send_ubx(ubx_cfg_msg(sentence, 0)):
+                print(f"GPS did not acknowledge disabling {sentence}")
+
+        if self.target_baud_rate and self.target_baud_rate != self.baud_rate:
+            # The receiver switches right after CFG-PRT, usually before its ACK gets out,
+            # so the switch is verified by the next command at the new baud rate.
+            self.serial_port.write(ubx_cfg_prt(self.target_baud_rate))
+            self.serial_port.flush()
+            time.sleep(0.1)
+            self.serial_port.baudrate = self.target_baud_rate
+            if self.send_ubx(ubx_packet(UBX_CLASS_CFG, UBX_CFG_PRT, b'\x01')) is not None:
+                self.baud_rate = self.target_baud_rate
+            elif self.detect_baud_rate():
+                # The poll was missed, the receiver answers at one of the two rates
+                print(f"GPS did not acknowledge the switch, it is at {self.baud_rate} baud")
+
+        if self.rate_hz:
+            # Keep the output within the link: roughly 80 bytes per enabled sentence per epoch
+            sentences = len(NMEA_MESSAGE_IDS) - len(set(self.disabled_sentences or ()))
+            max_rate = max(1, int(self.baud_rate / 10 / (80 * max(1, sentences))))
+            rate_hz = min(self.rate_hz, max_rate)
+            if self.send_ubx(ubx_cfg_rate(int(round(1000 / rate_hz)))):
+                print(f"GPS navigation rate set to {rate_hz} Hz at {self.baud_rate} baud")
+            else:
+                print("GPS did not acknowledge the navigation rate, keeping its default rate")
+
+    def feed(self, line, host_time):
+        # Parse one sentence and publish the fix if it changed the position
+        if self.parser.parse(line, host_time):
+            self.latest_fix = self.parser.fix.copy()
+            self.fixes += 1
+            for callback in self.callbacks:
+                # A failing consumer must not end the reader or starve the others
+                try:
+                    callback(self.latest_fix)
+                except Exception as e:
+                    self.callback_errors += 1
+                    print(f"Error in GPS fix callback: {e}")
+
+    def run(self):
+        # Reads until stop_event is set
+        buffer = b''
+        while not self.stop_event.is_set():
+            try:
+                # Blocks until data arrives or the timeout expires; no polling delay
+                data = self.serial_port.read(max(1, self.serial_port.in_waiting))
+            except serial.SerialException as e:
+                print(f"Serial exception: {e}")
+                break
+            if not data:
+                continue
+            host_time = time.monotonic()
+            buffer += data
+            *lines, buffer = buffer.split(b'\n')
+            for line in lines:
+                self.feed(line.decode('ascii', errors='ignore').strip(), host_time)
+            if len(buffer) > 1024:  # no line ending in sight, resynchronize
+                buffer = b''
@@ -0,0 +1,97 @@
+# coding: UTF-8
+"""
+    Decoder benchmark
+    Compares the per-byte and the bulk (chunk) decoding paths of WitProtocolResolver
+    on a recorded byte stream. Without an argument a stream is synthesized with all
+    packet types turned on and some line noise mixed in. The bulk path notifies
+    once per chunk, so its update count is the number of chunks with new data.
+    Usage: python benchmark_decoder.py [recorded_stream.bin] [chunk_size]
+"""
+import sys
+import time
+import random
+import lib.device_model as deviceModel
+from lib.data_processor.roles.jy901s_dataProcessor import JY901SDataProcessor
+from lib.protocol_resolver.roles.wit_protocol_resolver import WitProtocolResolver
+
+PACKET_TYPES = [0x50, 0x51, 0x52, 0x53, 0x54, 0x57, 0x58, 0x59]
+
+def makePacket(packetType, payload):
+    """
+    Build one 11-byte WIT packet
+    :param packetType: Packet type byte
+    :param payload: 8 payload bytes
+    :return:
+    """
+    packet = bytes([0x55, packetType]) + bytes(payload)
+    return packet + bytes([sum(packet) & 0xFF])
+
+def synthesizeStream(seconds=60, rate=200, noise=0.001, seed=1):
+    """
+    Synthesize a byte stream equivalent to the device output at the given rate
+    :param seconds: Stream length in seconds
+    :param rate: Output rate in Hz (one packet of each type per cycle)
+    :param noise: Probability of a corrupted byte after each packet
+    :param seed: Random seed
+    :return:
+    """
+    rnd = random.Random(seed)
+    out = bytearray()
+    for _ in range(seconds * rate):
+        for packetType in PACKET_TYPES:
+            out += makePacket(packetType, [rnd.randrange(256) for _ in range(8)])
+            if rnd.random() < noise:
+                out.append(rnd.randrange(256))
+    return bytes(out)
+
+def runDecoder(stream, chunkSize, bulkDecode, framingOnly=False):
+    """
+    Feed the stream through a resolver chunk by chunk
+    :param stream: Recorded byte stream
+    :param chunkSize: Bytes handed over per serial read
+    :param bulkDecode: Use the bulk decoder
+    :param framingOnly: Replace the packet handlers with no-ops to time sync/checksum handling alone
+    :return: (elapsed seconds, update events, device data)
+    """
+    resolver = WitProtocolResolver(bulkDecode=bulkDecode)
+    if framingOnly:
+        for packetType, (handler, update) in resolver.PacketHandlers.items():
+            resolver.PacketHandlers[packetType] = (lambda datahex, model: None, update)
+    processor = JY901SDataProcessor()
+    device = deviceModel.DeviceModel("bench", resolver, processor, "51_0")
+    updates = [0]
+
+    def onUpdate(model):
+        updates[0] += 1
+
+    processor.onVarChanged.append(onUpdate)             # onUpdate is static and reads the class-level list
+    view = memoryview(stream)
+    start = time.perf_counter()
+    for offset in range(0, len(stream), chunkSize):
+        resolver.passiveReceiveData(view[offset:offset + chunkSize], device)
+    elapsed = time.perf_counter() - start
+    processor.onVarChanged.remove(onUpdate)
+    tData = device.getSample().asDict()
+    tData.pop("hostTime")
+    return elapsed, updates[0], tData
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "rb") as f:
+            stream = f.read()
+    else:
+        stream = synthesizeStream()
+    chunkSize = int(sys.argv[2]) if len(sys.argv) > 2 else 256
+
+    byteTime, byteUpdates, byteData = runDecoder(stream, chunkSize, False)
+    bulkTime, bulkUpdates, bulkData = runDecoder(stream, chunkSize, True)
+
+    print(f"Stream: {len(stream)} bytes, chunk size {chunkSize}")
+    print(f"Per-byte: {byteTime:.3f} s, {byteUpdates} updates, {len(stream) / byteTime / 1e6:.2f} MB/s")
+    print(f"Bulk:     {bulkTime:.3f} s, {bulkUpdates} updates, {len(stream) / bulkTime / 1e6:.2f} MB/s")
+    print(f"Speed-up: {byteTime / bulkTime:.1f}x")
+    byteFraming = runDecoder(stream, chunkSize, False, True)[0]
+    bulkFraming = runDecoder(stream, chunkSize, True, True)[0]
+    print(f"Framing only: per-byte {byteFraming:.3f} s, bulk {bulkFraming:.3f} s, "
+          f"speed-up {byteFraming / bulkFraming:.1f}x")
+    print("Decoded data identical: " + str(byteData == bulkData))
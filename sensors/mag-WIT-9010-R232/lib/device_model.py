@@ -5,6 +5,8 @@ import time
 import struct
 import serial
 from serial import SerialException
+from lib.imu_sample import ImuSample
+from lib.replay_port import ReplayPort
 
 '''
     Serial Configuration
@@ -17,6 +19,21 @@ class SerialConfig:
     # Baud rate
     baud = 9600
 
+    # Minimum number of bytes a blocking read waits for (one packet)
+    minChunkSize = 11
+
+    # Inter-byte timeout in seconds, ends a read early when the line goes idle
+    interByteTimeout = 0.005
+
+    # Read timeout in seconds, bounds how long the reader takes to notice a stop request
+    readTimeout = 0.5
+
+    # Captured byte log to replay instead of opening portName (see ReplayPort)
+    replayFile = ''
+
+    # Replay speed factor, 0 replays as fast as possible
+    replaySpeed = 1.0
+
 '''
 Device Model
 '''
@@ -28,8 +45,14 @@ class DeviceModel:
     # Device ID
     ADDR = 0x50
 
-    # Device data dictionary
-    deviceData = {}
+    # Device data dictionary, holds values that have no field in ImuSample
+    deviceData = None
+
+    # Sample being filled in place by the protocol resolver
+    sample = None
+
+    # Last published sample, replaced as a whole and never modified afterwards
+    latestSample = None
 
     # Whether the device is open
     isOpen = False
@@ -49,12 +72,26 @@ class DeviceModel:
     # Protocol resolver
     protocolResolver = None
 
+    # Data reading thread
+    readThread = None
+
+    # Stop signal for the data reading thread
+    stopEvent = None
+
+    # Reader statistics, refreshed about once per second
+    readerStats = None
+
     def __init__(self, deviceName, protocolResolver, dataProcessor, dataUpdateListener):
         print("Initializing device model")
         self.deviceName = deviceName
         self.protocolResolver = protocolResolver
         self.dataProcessor = dataProcessor
         self.dataUpdateListener = dataUpdateListener
+        self.deviceData = {}
+        self.sample = ImuSample()
+        self.latestSample = ImuSample()
+        self.stopEvent = threading.Event()
+        self.readerStats = {"cpuPerSecond": 0.0, "bytesPerSecond": 0.0, "chunksPerSecond": 0.0}
 
     def setDeviceData(self, key, value):
         """
@@ -63,15 +100,21 @@ class DeviceModel:
         :param value: Data value
         :return: No return
         """
-        self.deviceData[key] = value
+        if key in ImuSample.__slots__:
+            setattr(self.sample, key, value)
+        else:
+            self.deviceData[key] = value
 
     def getDeviceData(self, key):
         """
-        Get device data
+        Get device data from the sample being filled
+        Use getSample() to read several values of one consistent sample.
         :param key: Data key
         :return: Returns data value; returns None if key does not exist
         """
-        return self.deviceData.get(key, None)
+        if key in self.deviceData:
+            return self.deviceData[key]
+        return self.sample.get(key)
 
     def removeDeviceData(self, key):
         """
@@ -79,53 +122,108 @@ class DeviceModel:
         :param key: Data key
         :return: No return
         """
-        self.deviceData.pop(key, None)
+        if key in ImuSample.__slots__:
+            setattr(self.sample, key, None)
+        else:
+            self.deviceData.pop(key, None)
+
+    def publishSample(self):
+        """
+        Publish a snapshot of the sample being filled
+        The snapshot is swapped in with a single reference assignment, so readers
+        always see one complete sample without locking.
+        :return: No return
+        """
+        self.latestSample = self.sample.copy()
+
+    def getSample(self):
+        """
+        Get the last published sample
+        :return: ImuSample, must not be modified
+        """
+        return self.latestSample
 
     def readDataTh(self, threadName, delay):
         """
         Data reading thread
+        Blocks in read() until minChunkSize bytes arrived, the line went idle for
+        interByteTimeout or readTimeout expired, so no CPU is used while waiting.
         :return:
         """
         print("Starting " + threadName)
-        while True:
-            # If the serial port is open
-            if self.isOpen:
-                try:
-                    tlen = self.serialPort.inWaiting()
-                    if tlen > 0:
-                        data = self.serialPort.read(tlen)
-                        self.onDataReceived(data)
-                except Exception as ex:
-                    print(ex)
-            else:
-                time.sleep(0.1)
-                print("Paused")
-                break
-
-    def openDevice(self):
+        statStart = time.monotonic()
+        cpuStart = time.thread_time()
+        tBytes = 0
+        tChunks = 0
+        while self.isOpen and not self.stopEvent.is_set():
+            try:
+                data = self.serialPort.read(max(self.serialConfig.minChunkSize, self.serialPort.in_waiting))
+                if len(data) > 0:
+                    tBytes += len(data)
+                    tChunks += 1
+                    self.onDataReceived(data)
+            except Exception as ex:
+                if self.stopEvent.is_set():                 # Port closed underneath a pending read
+                    break
+                print(ex)
+                self.stopEvent.wait(0.1)
+            now = time.monotonic()
+            if now - statStart >= 1.0:                      # CPU time used per second of stream
+                elapsed = now - statStart
+                cpuNow = time.thread_time()
+                self.readerStats = {
+                    "cpuPerSecond": (cpuNow - cpuStart) / elapsed,
+                    "bytesPerSecond": tBytes / elapsed,
+                    "chunksPerSecond": tChunks / elapsed,
+                }
+                statStart, cpuStart, tBytes, tChunks = now, cpuNow, 0, 0
+        print("Paused")
+
+    def getReaderStats(self):
+        """
+        Get reader statistics
+        :return: Dictionary with CPU seconds per second of stream, bytes and chunks per second
+        """
+        return self.readerStats
+
+    def openDevice(self, startReadThread=True):
         """
         Open the device
+        :param startReadThread: Start the reading thread; if False the caller runs readDataTh itself
         :return: No return
         """
         # Close the port first
         self.closeDevice()
         try:
-            self.serialPort = serial.Serial(self.serialConfig.portName, self.serialConfig.baud, timeout=0.5)
+            if self.serialConfig.replayFile:
+                self.serialPort = ReplayPort(self.serialConfig.replayFile, self.serialConfig.replaySpeed,
+                                             self.serialConfig.baud, self.serialConfig.readTimeout)
+            else:
+                self.serialPort = serial.Serial(self.serialConfig.portName, self.serialConfig.baud,
+                                                timeout=self.serialConfig.readTimeout,
+                                                inter_byte_timeout=self.serialConfig.interByteTimeout)
             self.isOpen = True
-            t = threading.Thread(target=self.readDataTh, args=("Data-Received-Thread", 10,))  # Start a thread to receive data
-            t.start()
-        except SerialException:
-            print(f"Failed to open {self.serialConfig.portName} at {self.serialConfig.baud}")
+            self.stopEvent.clear()
+            if startReadThread:
+                self.readThread = threading.Thread(target=self.readDataTh, args=("Data-Received-Thread", 10,))  # Start a thread to receive data
+                self.readThread.start()
+        except (SerialException, OSError):
+            print(f"Failed to open {self.serialConfig.replayFile or self.serialConfig.portName} at {self.serialConfig.baud}")
 
     def closeDevice(self):
         """
         Close the device
+        Signals the reading thread to stop and joins it before the port is closed.
         :return: No return
         """
+        self.stopEvent.set()
+        self.isOpen = False
+        if self.readThread is not None and self.readThread is not threading.current_thread():
+            self.readThread.join(self.serialConfig.readTimeout + 1.0)
+            self.readThread = None
         if self.serialPort is not None:
             self.serialPort.close()
             print("Port closed")
-        self.isOpen = False
         print("Device closed")
 
     def onDataReceived(self, data):
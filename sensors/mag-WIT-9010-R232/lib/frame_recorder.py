@@ -0,0 +1,146 @@
+# coding: UTF-8
+import os
+import time
+import queue
+import datetime
+import threading
+import numpy as np
+
+"""
+    Frame Recorder
+    Binary, append-only log of raw WIT packets. A log file is an 8-byte header
+    followed by fixed-width records: host time (float64 seconds since the epoch,
+    little endian) and the 11 raw packet bytes.
+"""
+
+# File header, the last byte is the format version
+LOG_HEADER = b"WITLOG\x00\x01"
+
+# Record layout of a log file
+RECORD_DTYPE = np.dtype([("hostTime", "<f8"), ("frame", "u1", (11,))])
+
+
+class FrameRecorder:
+    """
+    Writes packets to rotating log files from a background thread
+    record() only queues the packets of one serial chunk, so the decode thread
+    never waits for the SD card.
+    """
+
+    def __init__(self, directory=".", prefix="wit", maxBytes=64 * 1024 * 1024, maxSeconds=3600.0, queueSize=1024):
+        """
+        :param directory: Directory for the log files
+        :param prefix: File name prefix, followed by the start time
+        :param maxBytes: Rotate the file once it reaches this size
+        :param maxSeconds: Rotate the file once it is this old
+        :param queueSize: Chunks that may wait for the writer before new ones are dropped
+        """
+        self.directory = directory
+        self.prefix = prefix
+        self.maxBytes = maxBytes
+        self.maxSeconds = maxSeconds
+        self.queue = queue.Queue(queueSize)
+        self.thread = None
+        self.file = None
+        self.fileName = None
+        self.fileBytes = 0
+        self.fileOpened = 0.0
+        self.recordCount = 0                            # Packets written
+        self.droppedChunks = 0                          # Chunks dropped because the writer fell behind
+
+    def start(self):
+        """
+        Start the writer thread
+        :return: No return
+        """
+        if self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self._writeTh, name="Frame-Recorder-Thread", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        Write out the queued packets, stop the writer thread and close the file
+        :return: No return
+        """
+        if self.thread is None:
+            return
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+
+    def record(self, hostTime, frames):
+        """
+        Queue the packets of one chunk
+        :param hostTime: Host receive time (time.time())
+        :param frames: Concatenated 11-byte packets
+        :return: No return
+        """
+        try:
+            self.queue.put_nowait((hostTime, bytes(frames)))
+        except queue.Full:
+            self.droppedChunks += 1
+
+    def _openFile(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.fileName = os.path.join(self.directory,
+                                     self.prefix + datetime.datetime.now().strftime('%Y%m%d%H%M%S%f') + ".bin")
+        self.file = open(self.fileName, "wb", buffering=256 * 1024)
+        self.file.write(LOG_HEADER)
+        self.fileBytes = len(LOG_HEADER)
+        self.fileOpened = time.monotonic()
+
+    def _closeFile(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def _writeTh(self):
+        try:
+            while True:
+                item = self.queue.get()
+                if item is None:
+                    break
+                hostTime, frames = item
+                count = len(frames) // RECORD_DTYPE["frame"].shape[0]
+                if count == 0:
+                    continue
+                if self.file is None or self.fileBytes >= self.maxBytes \
+                        or time.monotonic() - self.fileOpened >= self.maxSeconds:
+                    self._closeFile()
+                    self._openFile()
+                tRecords = np.empty(count, dtype=RECORD_DTYPE)
+                tRecords["hostTime"] = hostTime
+                tRecords["frame"] = np.frombuffer(frames, dtype=np.uint8, count=count * 11).reshape(count, 11)
+                self.file.write(tRecords.tobytes())
+                self.fileBytes += tRecords.nbytes
+                self.recordCount += count
+        finally:
+            self._closeFile()
+
+
+def readLog(fileName):
+    """
+    Memory-map a log file
+    :param fileName: Log file
+    :return: Structured array with hostTime and frame fields; a truncated last record is ignored
+    """
+    with open(fileName, "rb") as f:
+        if f.read(len(LOG_HEADER)) != LOG_HEADER:
+            raise ValueError(f"{fileName} is not a WIT frame log")
+    count = (os.path.getsize(fileName) - len(LOG_HEADER)) // RECORD_DTYPE.itemsize
+    if count == 0:
+        return np.empty(0, dtype=RECORD_DTYPE)
+    return np.memmap(fileName, dtype=RECORD_DTYPE, mode="r", offset=len(LOG_HEADER), shape=(count,))
+
+
+def packetValues(records, packetType):
+    """
+    Extract the payload of one packet type as signed 16-bit values
+    :param records: Records from readLog
+    :param packetType: Packet type byte, e.g. 0x51 for acceleration
+    :return: (host times, int16 array of shape (n, 4))
+    """
+    tRecords = records[records["frame"][:, 1] == packetType]
+    payload = np.ascontiguousarray(tRecords["frame"][:, 2:10])
+    return tRecords["hostTime"], payload.view("<i2")
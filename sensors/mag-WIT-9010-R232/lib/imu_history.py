@@ -0,0 +1,96 @@
+# coding: UTF-8
+from bisect import bisect_left
+from operator import attrgetter
+import numpy as np
+from lib.imu_sample import ImuSample
+
+"""
+    IMU Sample History
+"""
+
+# Numeric fields kept per record; the chip time is only available on ImuSample
+HISTORY_FIELDS = ("hostTime",) + tuple(name for name in ImuSample.__slots__ if name not in ("chipTime", "hostTime"))
+
+# Record layout of the history buffer
+HISTORY_DTYPE = np.dtype([(name, np.float64) for name in HISTORY_FIELDS])
+
+_NAN = float("nan")
+
+
+class ImuHistory:
+    """
+    Fixed-capacity ring buffer of published IMU samples
+    Every record is stored twice, at slot i and i + slots, so the newest n records
+    are always one contiguous slice and last(n) / window() return NumPy views
+    without copying. A view stays intact for (slots - n) further appends; readers
+    that hold a view across that many samples check isIntact() before trusting it.
+    Unset sample fields are stored as NaN.
+    """
+
+    def __init__(self, capacity=4096, guard=None):
+        """
+        :param capacity: Largest window that can be requested
+        :param guard: Extra slots that keep a full-size window intact while the writer continues (default capacity // 4)
+        """
+        self.capacity = capacity
+        self.slots = capacity + (capacity // 4 if guard is None else guard)
+        self.records = np.full(2 * self.slots, _NAN, dtype=HISTORY_DTYPE)
+        self.count = 0                                  # Records written so far, doubles as sequence number
+        self._getFields = attrgetter(*HISTORY_FIELDS)
+
+    def append(self, sample):
+        """
+        Append a sample (called from the serial thread)
+        :param sample: ImuSample
+        :return: No return
+        """
+        tRecord = tuple(_NAN if value is None else value for value in self._getFields(sample))
+        index = self.count % self.slots
+        self.records[index] = tRecord
+        self.records[index + self.slots] = tRecord
+        self.count += 1                                 # Publish only after both copies are complete
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def last(self, n):
+        """
+        Get the newest n records
+        :param n: Number of records, limited to the capacity and the records written
+        :return: View of the records, oldest first
+        """
+        return self.lastWithSequence(n)[1]
+
+    def lastWithSequence(self, n):
+        """
+        Get the newest n records and the sequence number of the oldest one
+        :param n: Number of records, limited to the capacity and the records written
+        :return: (sequence number for isIntact(), view of the records, oldest first)
+        """
+        count = self.count
+        n = max(0, min(n, count, self.capacity))
+        start = (count - n) % self.slots
+        return count - n, self.records[start:start + n]
+
+    def window(self, seconds, now=None):
+        """
+        Get the records received in the last seconds
+        :param seconds: Window length in seconds
+        :param now: End of the window (time.monotonic()); defaults to the newest record
+        :return: View of the records, oldest first
+        """
+        tRecords = self.last(self.capacity)
+        if len(tRecords) == 0:
+            return tRecords
+        times = tRecords["hostTime"]
+        if now is None:
+            now = times[-1]
+        return tRecords[bisect_left(times, now - seconds):]
+
+    def isIntact(self, firstSequence):
+        """
+        Check that a record has not been overwritten yet
+        :param firstSequence: Sequence number of the oldest record in use (from lastWithSequence)
+        :return:
+        """
+        return self.count - firstSequence <= self.slots
@@ -0,0 +1,97 @@
+# coding: UTF-8
+from operator import attrgetter
+
+"""
+    IMU Sample Record
+"""
+
+class ImuSample:
+    """
+    One sample of every quantity the device reports
+    Decoders fill the fields in place with full-precision values; rounding is
+    only applied when presenting them (rounded / asDict).
+    """
+    __slots__ = (
+        "accX", "accY", "accZ", "temperature",      # Acceleration (g), temperature (°C)
+        "gyroX", "gyroY", "gyroZ",                  # Angular velocity (deg/s)
+        "angleX", "angleY", "angleZ",               # Angle (deg)
+        "magX", "magY", "magZ",                     # Magnetic field (raw counts)
+        "lon", "lat",                               # Longitude and latitude (deg)
+        "Height", "Yaw", "Speed",                   # GPS height (m), heading (deg), speed
+        "q1", "q2", "q3", "q4",                     # Quaternion
+        "chipTime",                                 # (year, month, day, hour, minute, second, millisecond)
+        "hostTime",                                 # Host receive time (time.monotonic())
+    )
+
+    # Decimal places used when presenting a field
+    Precision = {
+        "accX": 4, "accY": 4, "accZ": 4, "temperature": 2,
+        "gyroX": 4, "gyroY": 4, "gyroZ": 4,
+        "angleX": 3, "angleY": 3, "angleZ": 3,
+        "magX": 0, "magY": 0, "magZ": 0,
+        "lon": 8, "lat": 8,
+        "Height": 3, "Yaw": 2, "Speed": 3,
+        "q1": 5, "q2": 5, "q3": 5, "q4": 5,
+    }
+
+    _getAll = attrgetter(*__slots__)
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, None)
+
+    def copy(self):
+        """
+        Copy the sample
+        :return: New sample with the same values
+        """
+        tSample = ImuSample.__new__(ImuSample)
+        for name, value in zip(self.__slots__, ImuSample._getAll(self)):
+            setattr(tSample, name, value)
+        return tSample
+
+    def get(self, key):
+        """
+        Get a value by field name; "Chiptime" returns the formatted chip time
+        :param key: Field name
+        :return: Returns the value; returns None if the field does not exist or is not set
+        """
+        if key == "Chiptime":
+            return self.formatChipTime()
+        return getattr(self, key, None)
+
+    def rounded(self, key):
+        """
+        Get a value rounded for presentation
+        :param key: Field name
+        :return:
+        """
+        value = self.get(key)
+        digits = self.Precision.get(key)
+        if value is None or digits is None:
+            return value
+        return round(value, digits)
+
+    def formatChipTime(self):
+        """
+        Format the chip time as text
+        :return: Returns "YYYY-MM-DD hh:mm:ss.ms"; returns None if not set
+        """
+        if self.chipTime is None:
+            return None
+        year, month, day, hour, minute, second, millisecond = self.chipTime
+        return f"{year}-{month:02}-{day:02} {hour:02}:{minute:02}:{second:02}.{millisecond}"
+
+    def asDict(self, rounded=False):
+        """
+        Get all fields as a dictionary
+        :param rounded: Round the values and format the chip time for presentation
+        :return:
+        """
+        tValues = dict(zip(self.__slots__, ImuSample._getAll(self)))
+        if rounded:
+            for key, digits in self.Precision.items():
+                if tValues[key] is not None:
+                    tValues[key] = round(tValues[key], digits)
+            tValues["chipTime"] = self.formatChipTime()
+        return tValues
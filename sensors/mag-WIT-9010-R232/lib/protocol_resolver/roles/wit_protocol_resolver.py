@@ -1,11 +1,20 @@
 # coding: UTF-8
 import time
+import struct
+import numpy as np
 from lib.protocol_resolver.interface.i_protocol_resolver import IProtocolResolver
 
 """
     Wit Protocol Resolver
 """
 
+# Packet payload layouts, the payload starts at offset 2
+_INT16X3 = struct.Struct("<hhh")
+_INT16X4 = struct.Struct("<hhhh")
+_UINT32X2 = struct.Struct("<II")
+_GPS = struct.Struct("<hhI")            # Height, heading, speed
+_CHIPTIME = struct.Struct("<BBBBBBH")   # Year, month, day, hour, minute, second, millisecond
+
 class WitProtocolResolver(IProtocolResolver):
     TempBytes = []         # Temporary data list
     PackSize = 11          # Size of one data packet
@@ -13,6 +22,37 @@ class WitProtocolResolver(IProtocolResolver):
     accRange = 16.0        # Acceleration range
     angleRange = 180.0     # Angle range
     TempFindValues = []    # Data returned from reading a specific register
+    BulkDecode = False     # Decode whole serial chunks at once instead of byte by byte
+    History = None         # ImuHistory receiving every published sample
+    Recorder = None        # FrameRecorder receiving every valid raw packet
+
+    def __init__(self, bulkDecode=False, history=None, recorder=None):
+        """
+        :param bulkDecode: Use the chunk decoder (bulkReceiveData) for passively received data
+        :param history: ImuHistory to fill with every published sample (one per chunk in bulk mode)
+        :param recorder: FrameRecorder to hand every valid raw packet to
+        """
+        self.BulkDecode = bulkDecode
+        self.History = history
+        self.Recorder = recorder
+        self.RecordBytes = bytearray()                  # Valid packets of the current chunk, for the recorder
+        self.PacketCount = 0                            # Valid packets decoded so far
+        self.TempBytes = []
+        self.TempFindValues = []
+        self.CarryBytes = bytearray(self.PackSize - 1)  # Partial packet carried over between chunks
+        self.CarryLen = 0                               # Number of valid bytes in CarryBytes
+        # Packet type -> (handler, whether the packet triggers a data update event)
+        self.PacketHandlers = {
+            0x50: (self.get_chiptime, False),
+            0x51: (self.get_acc, False),
+            0x52: (self.get_gyro, False),
+            0x53: (self.get_angle, False),
+            0x54: (self.get_mag, True),
+            0x57: (self.get_lonlat, True),
+            0x58: (self.get_gps, True),
+            0x59: (self.get_four_elements, True),
+            0x5F: (self.get_find, False),
+        }
 
     def setConfig(self, deviceModel):
         pass
@@ -27,7 +67,23 @@ class WitProtocolResolver(IProtocolResolver):
         :param deviceModel: Device model
         :return:
         """
-        global TempBytes
+        deviceModel.sample.hostTime = time.monotonic()       # Host receive time of this chunk
+        if self.BulkDecode:
+            self.bulkReceiveData(data, deviceModel)
+        else:
+            self.byteReceiveData(data, deviceModel)
+        if self.RecordBytes:                                # Hand the chunk's packets to the recorder at once
+            if self.Recorder is not None:
+                self.Recorder.record(time.time(), self.RecordBytes)
+            self.RecordBytes.clear()
+
+    def byteReceiveData(self, data, deviceModel):
+        """
+        Decode serial data byte by byte
+        :param data: Serial data
+        :param deviceModel: Device model
+        :return:
+        """
         for val in data:
             self.TempBytes.append(val)
             if self.TempBytes[0] != 0x55:                   # Not starting with identifier 0x55
@@ -40,32 +96,140 @@ class WitProtocolResolver(IProtocolResolver):
             if len(self.TempBytes) == self.PackSize:        # Indicates one packet of data
                 CheckSum = sum(self.TempBytes[:-1])         # Calculate checksum
                 if (CheckSum & 0xFF) == self.TempBytes[self.PackSize - 1]:  # Checksum validation
-                    if self.TempBytes[1] == 0x50:           # Chip time packet
-                        self.get_chiptime(self.TempBytes, deviceModel)  # Process chip time data
-                    elif self.TempBytes[1] == 0x51:         # Acceleration packet
-                        self.get_acc(self.TempBytes, deviceModel)       # Process acceleration data
-                    elif self.TempBytes[1] == 0x52:         # Gyroscope packet
-                        self.get_gyro(self.TempBytes, deviceModel)      # Process gyroscope data
-                    elif self.TempBytes[1] == 0x53:         # Angle packet
-                        self.get_angle(self.TempBytes, deviceModel)     # Process angle data
-                    elif self.TempBytes[1] == 0x54:         # Magnetic field packet
-                        self.get_mag(self.TempBytes, deviceModel)       # Process magnetic field data
-                        deviceModel.dataProcessor.onUpdate(deviceModel) # Trigger data update event
-                    elif self.TempBytes[1] == 0x57:         # Longitude and latitude packet
-                        self.get_lonlat(self.TempBytes, deviceModel)    # Process longitude and latitude data
-                        deviceModel.dataProcessor.onUpdate(deviceModel) # Trigger data update event
-                    elif self.TempBytes[1] == 0x58:         # GPS packet
-                        self.get_gps(self.TempBytes, deviceModel)       # Process GPS data
-                        deviceModel.dataProcessor.onUpdate(deviceModel) # Trigger data update event
-                    elif self.TempBytes[1] == 0x59:         # Quaternion packet
-                        self.get_four_elements(self.TempBytes, deviceModel)  # Process quaternion data
-                        deviceModel.dataProcessor.onUpdate(deviceModel) # Trigger data update event
-                    elif self.TempBytes[1] == 0x5F:         # Return data from specific register read
-                        self.get_find(self.TempBytes, deviceModel)
+                    self.dispatchPacket(bytes(self.TempBytes), deviceModel)
                     self.TempBytes = []                     # Clear data
                 else:                                       # Checksum failed
                     del self.TempBytes[0]                   # Remove the first byte
 
+    def bulkReceiveData(self, data, deviceModel):
+        """
+        Decode a whole serial chunk at once
+        Every 0x55 sync position is located and all checksums are verified in one
+        vectorized pass. Only the newest packet of each type is decoded, since it
+        overwrites the older ones, and the sample is published and listeners are
+        notified once per chunk. Bytes of a trailing partial packet are carried
+        over to the next chunk.
+        :param data: Serial data (bytes, bytearray or memoryview)
+        :param deviceModel: Device model
+        :return:
+        """
+        if self.CarryLen > 0:
+            buf = self.CarryBytes[:self.CarryLen] + data    # Prepend the partial packet from the last chunk
+        else:
+            buf = data
+        tBytes = np.frombuffer(buf, dtype=np.uint8)
+        tLen = tBytes.size
+        nextFree = 0                                        # First byte not consumed by a decoded packet
+        count = tLen // self.PackSize
+        starts = None
+        if count > 0 and tBytes[0] == 0x55:
+            # Usual case: the chunk is back-to-back packets, checked as one (count, 11) view
+            rows = tBytes[:count * self.PackSize].reshape(count, self.PackSize)
+            types = rows[:, 1]
+            if (rows[:, 0] == 0x55).all() \
+                    and ((rows[:, :-1].sum(axis=1) & 0xFF) == rows[:, -1]).all() \
+                    and (((types >= 0x50) & (types <= 0x5A)) | (types == 0x5F)).all():
+                starts = np.arange(0, count * self.PackSize, self.PackSize)
+        lastStart = tLen - self.PackSize                    # Last position a complete packet can start at
+        if starts is None and lastStart >= 0:
+            # Resync: every sync position is a candidate packet
+            starts = np.flatnonzero(tBytes[:lastStart + 1] == 0x55)
+            sums = np.zeros(tLen + 1, dtype=np.uint32)
+            np.cumsum(tBytes, out=sums[1:])
+            checks = (sums[starts + self.PackSize - 1] - sums[starts]) & 0xFF
+            types = tBytes[starts + 1]
+            valid = (checks == tBytes[starts + self.PackSize - 1]) \
+                & (((types >= 0x50) & (types <= 0x5A)) | (types == 0x5F))
+            starts = starts[valid]
+            if starts.size > 1 and (np.diff(starts) < self.PackSize).any():
+                starts = self.dropOverlapping(starts)       # Sync byte inside an already decoded packet
+        if starts is not None and starts.size > 0:
+            self.dispatchPackets(buf, tBytes, starts, deviceModel)
+            nextFree = int(starts[-1]) + self.PackSize
+        # Carry over a partial packet, starting at the first sync byte that cannot hold a full packet yet
+        tailStart = max(nextFree, tLen - (self.PackSize - 1))
+        tail = np.flatnonzero(tBytes[tailStart:] == 0x55)
+        if tail.size > 0:
+            carryStart = tailStart + int(tail[0])
+            self.CarryLen = tLen - carryStart
+            self.CarryBytes[:self.CarryLen] = buf[carryStart:]
+        else:
+            self.CarryLen = 0
+
+    def dropOverlapping(self, starts):
+        """
+        Keep the packets the per-byte decoder would accept: the first valid packet wins
+        and packets starting inside it are dropped
+        :param starts: Start offsets of checksum-validated packets, ascending
+        :return:
+        """
+        kept = []
+        nextFree = 0
+        for start in starts.tolist():
+            if start >= nextFree:
+                kept.append(start)
+                nextFree = start + self.PackSize
+        return np.array(kept, dtype=starts.dtype)
+
+    def dispatchPackets(self, buf, tBytes, starts, deviceModel):
+        """
+        Hand the checksum-validated packets of one chunk to their handlers
+        Register reads (0x5F) are all kept in order; of the other types only the
+        newest packet is decoded. The sample is published once if the chunk held a
+        packet that triggers a data update event.
+        :param buf: Chunk
+        :param tBytes: Chunk as a NumPy byte array
+        :param starts: Start offsets of the packets, ascending and not overlapping
+        :param deviceModel: Device model
+        :return:
+        """
+        self.PacketCount += starts.size
+        if self.Recorder is not None:
+            self.RecordBytes += tBytes[starts[:, None] + np.arange(self.PackSize)].tobytes()
+        startList = starts.tolist()
+        typeList = tBytes[starts + 1].tolist()
+        if 0x5F in typeList:                                # Register reads, in stream order
+            for start, packetType in zip(startList, typeList):
+                if packetType == 0x5F:
+                    self.get_find(buf[start:start + self.PackSize], deviceModel)
+        done = {0x5F}
+        update = False
+        for i in range(len(typeList) - 1, -1, -1):          # Newest packet of each type
+            packetType = typeList[i]
+            if packetType in done:
+                continue
+            done.add(packetType)
+            handler = self.PacketHandlers.get(packetType)
+            if handler is None:                             # Packet type without a handler
+                continue
+            handler[0](buf[startList[i]:startList[i] + self.PackSize], deviceModel)
+            update = update or handler[1]
+        if update:
+            deviceModel.publishSample()                     # Swap in a consistent snapshot
+            if self.History is not None:
+                self.History.append(deviceModel.sample)     # Keep the newest sample of the chunk in the history
+            deviceModel.dataProcessor.onUpdate(deviceModel) # Trigger data update event
+
+    def dispatchPacket(self, datahex, deviceModel):
+        """
+        Hand a checksum-validated packet to its handler
+        :param datahex: Original data packet
+        :param deviceModel: Device model
+        :return:
+        """
+        self.PacketCount += 1
+        if self.Recorder is not None:
+            self.RecordBytes += datahex
+        handler = self.PacketHandlers.get(datahex[1])
+        if handler is None:                                 # Packet type without a handler
+            return
+        handler[0](datahex, deviceModel)
+        if handler[1]:
+            deviceModel.publishSample()                     # Swap in a consistent snapshot
+            if self.History is not None:
+                self.History.append(deviceModel.sample)     # Keep the sample in the history
+            deviceModel.dataProcessor.onUpdate(deviceModel) # Trigger data update event
+
     def get_readbytes(self, regAddr):
         """
         Get read command
@@ -90,24 +254,14 @@ class WitProtocolResolver(IProtocolResolver):
         :param deviceModel: Device model
         :return:
         """
-        axl, axh = datahex[2], datahex[3]
-        ayl, ayh = datahex[4], datahex[5]
-        azl, azh = datahex[6], datahex[7]
-        tempVal = (datahex[9] << 8 | datahex[8])
+        ax, ay, az, tempVal = _INT16X4.unpack_from(datahex, 2)
+        scale = self.accRange / 32768.0
 
-        acc_x = (axh << 8 | axl) / 32768.0 * self.accRange
-        acc_y = (ayh << 8 | ayl) / 32768.0 * self.accRange
-        acc_z = (azh << 8 | azl) / 32768.0 * self.accRange
-
-        # Adjust for range
-        if acc_x >= self.accRange: acc_x -= 2 * self.accRange
-        if acc_y >= self.accRange: acc_y -= 2 * self.accRange
-        if acc_z >= self.accRange: acc_z -= 2 * self.accRange
-
-        deviceModel.setDeviceData("accX", round(acc_x, 4))    # Set device model acceleration X
-        deviceModel.setDeviceData("accY", round(acc_y, 4))    # Set device model acceleration Y
-        deviceModel.setDeviceData("accZ", round(acc_z, 4))    # Set device model acceleration Z
-        deviceModel.setDeviceData("temperature", round(tempVal / 100.0, 2))  # Set device model temperature
+        tSample = deviceModel.sample
+        tSample.accX = ax * scale                           # Acceleration X
+        tSample.accY = ay * scale                           # Acceleration Y
+        tSample.accZ = az * scale                           # Acceleration Z
+        tSample.temperature = tempVal / 100.0               # Temperature
 
     def get_gyro(self, datahex, deviceModel):
         """
@@ -116,22 +270,13 @@ class WitProtocolResolver(IProtocolResolver):
         :param deviceModel: Device model
         :return:
         """
-        wxl, wxh = datahex[2], datahex[3]
-        wyl, wyh = datahex[4], datahex[5]
-        wzl, wzh = datahex[6], datahex[7]
-
-        gyro_x = (wxh << 8 | wxl) / 32768.0 * self.gyroRange
-        gyro_y = (wyh << 8 | wyl) / 32768.0 * self.gyroRange
-        gyro_z = (wzh << 8 | wzl) / 32768.0 * self.gyroRange
-
-        # Adjust for range
-        if gyro_x >= self.gyroRange: gyro_x -= 2 * self.gyroRange
-        if gyro_y >= self.gyroRange: gyro_y -= 2 * self.gyroRange
-        if gyro_z >= self.gyroRange: gyro_z -= 2 * self.gyroRange
+        wx, wy, wz = _INT16X3.unpack_from(datahex, 2)
+        scale = self.gyroRange / 32768.0
 
-        deviceModel.setDeviceData("gyroX", round(gyro_x, 4))  # Set device model gyroscope X
-        deviceModel.setDeviceData("gyroY", round(gyro_y, 4))  # Set device model gyroscope Y
-        deviceModel.setDeviceData("gyroZ", round(gyro_z, 4))  # Set device model gyroscope Z
+        tSample = deviceModel.sample
+        tSample.gyroX = wx * scale                          # Gyroscope X
+        tSample.gyroY = wy * scale                          # Gyroscope Y
+        tSample.gyroZ = wz * scale                          # Gyroscope Z
 
     def get_angle(self, datahex, deviceModel):
         """
@@ -140,22 +285,13 @@ class WitProtocolResolver(IProtocolResolver):
         :param deviceModel: Device model
         :return:
         """
-        rxl, rxh = datahex[2], datahex[3]
-        ryl, ryh = datahex[4], datahex[5]
-        rzl, rzh = datahex[6], datahex[7]
+        rx, ry, rz = _INT16X3.unpack_from(datahex, 2)
+        scale = self.angleRange / 32768.0
 
-        angle_x = (rxh << 8 | rxl) / 32768.0 * self.angleRange
-        angle_y = (ryh << 8 | ryl) / 32768.0 * self.angleRange
-        angle_z = (rzh << 8 | rzl) / 32768.0 * self.angleRange
-
-        # Adjust for range
-        if angle_x >= self.angleRange: angle_x -= 2 * self.angleRange
-        if angle_y >= self.angleRange: angle_y -= 2 * self.angleRange
-        if angle_z >= self.angleRange: angle_z -= 2 * self.angleRange
-
-        deviceModel.setDeviceData("angleX", round(angle_x, 3))  # Set device model angle X
-        deviceModel.setDeviceData("angleY", round(angle_y, 3))  # Set device model angle Y
-        deviceModel.setDeviceData("angleZ", round(angle_z, 3))  # Set device model angle Z
+        tSample = deviceModel.sample
+        tSample.angleX = rx * scale                         # Angle X
+        tSample.angleY = ry * scale                         # Angle Y
+        tSample.angleZ = rz * scale                         # Angle Z
 
     def get_mag(self, datahex, deviceModel):
         """
@@ -164,13 +300,8 @@ class WitProtocolResolver(IProtocolResolver):
         :param deviceModel: Device model
         :return:
         """
-        _x = deviceModel.get_int(bytes([datahex[2], datahex[3]]))
-        _y = deviceModel.get_int(bytes([datahex[4], datahex[5]]))
-        _z = deviceModel.get_int(bytes([datahex[6], datahex[7]]))
-
-        deviceModel.setDeviceData("magX", round(_x, 0))   # Set device model magnetic field X
-        deviceModel.setDeviceData("magY", round(_y, 0))   # Set device model magnetic field Y
-        deviceModel.setDeviceData("magZ", round(_z, 0))   # Set device model magnetic field Z
+        tSample = deviceModel.sample
+        tSample.magX, tSample.magY, tSample.magZ = _INT16X3.unpack_from(datahex, 2)
 
     def get_lonlat(self, datahex, deviceModel):
         """
@@ -179,14 +310,11 @@ class WitProtocolResolver(IProtocolResolver):
         :param deviceModel: Device model
         :return:
         """
-        lon = deviceModel.get_unint(bytes([datahex[2], datahex[3], datahex[4], datahex[5]]))
-        lat = deviceModel.get_unint(bytes([datahex[6], datahex[7], datahex[8], datahex[9]]))
-
-        tlon = int(lon / 10000000) + ((lon % 10000000) / 100000 / 60)
-        tlat = int(lat / 10000000) + ((lat % 10000000) / 100000 / 60)
+        lon, lat = _UINT32X2.unpack_from(datahex, 2)
 
-        deviceModel.setDeviceData("lon", round(tlon, 8))  # Set device model longitude
-        deviceModel.setDeviceData("lat", round(tlat, 8))  # Set device model latitude
+        tSample = deviceModel.sample
+        tSample.lon = lon // 10000000 + (lon % 10000000) / 100000 / 60     # ddmm.mmmmm -> degrees
+        tSample.lat = lat // 10000000 + (lat % 10000000) / 100000 / 60
 
     def get_gps(self, datahex, deviceModel):
         """
@@ -195,13 +323,12 @@ class WitProtocolResolver(IProtocolResolver):
         :param deviceModel: Device model
         :return:
         """
-        Height = deviceModel.get_int(bytes([datahex[2], datahex[3]])) / 10.0  # Height
-        Yaw = deviceModel.get_int(bytes([datahex[4], datahex[5]])) / 100.0    # Heading angle
-        Speed = deviceModel.get_unint(bytes([datahex[6], datahex[7], datahex[8], datahex[9]])) / 1e3  # Nautical miles
+        height, yaw, speed = _GPS.unpack_from(datahex, 2)
 
-        deviceModel.setDeviceData("Height", round(Height, 3))  # Set device model height
-        deviceModel.setDeviceData("Yaw", round(Yaw, 2))        # Set device model heading angle
-        deviceModel.setDeviceData("Speed", round(Speed, 3))    # Set device model speed
+        tSample = deviceModel.sample
+        tSample.Height = height / 10.0                      # Height
+        tSample.Yaw = yaw / 100.0                           # Heading angle
+        tSample.Speed = speed / 1e3                         # Speed
 
     def get_four_elements(self, datahex, deviceModel):
         """
@@ -210,15 +337,13 @@ class WitProtocolResolver(IProtocolResolver):
         :param deviceModel: Device model
         :return:
         """
-        q1 = deviceModel.get_int(bytes([datahex[2], datahex[3]])) / 32768.0
-        q2 = deviceModel.get_int(bytes([datahex[4], datahex[5]])) / 32768.0
-        q3 = deviceModel.get_int(bytes([datahex[6], datahex[7]])) / 32768.0
-        q4 = deviceModel.get_int(bytes([datahex[8], datahex[9]])) / 32768.0
+        q1, q2, q3, q4 = _INT16X4.unpack_from(datahex, 2)
 
-        deviceModel.setDeviceData("q1", round(q1, 5))  # Set device model quaternion component 1
-        deviceModel.setDeviceData("q2", round(q2, 5))  # Set device model quaternion component 2
-        deviceModel.setDeviceData("q3", round(q3, 5))  # Set device model quaternion component 3
-        deviceModel.setDeviceData("q4", round(q4, 5))  # Set device model quaternion component 4
+        tSample = deviceModel.sample
+        tSample.q1 = q1 / 32768.0                           # Quaternion component 1
+        tSample.q2 = q2 / 32768.0                           # Quaternion component 2
+        tSample.q3 = q3 / 32768.0                           # Quaternion component 3
+        tSample.q4 = q4 / 32768.0                           # Quaternion component 4
 
     def get_chiptime(self, datahex, deviceModel):
         """
@@ -227,21 +352,8 @@ class WitProtocolResolver(IProtocolResolver):
         :param deviceModel: Device model
         :return:
         """
-        tempVals = []  # Temporary data for calculations
-        for i in range(4):
-            tIndex = 2 + i * 2
-            tempVals.append(datahex[tIndex+1] << 8 | datahex[tIndex])
-
-        _year = 2000 + (tempVals[0] & 0xFF)      # Year
-        _month = ((tempVals[0] >> 8) & 0xFF)     # Month
-        _day = (tempVals[1] & 0xFF)              # Day
-        _hour = ((tempVals[1] >> 8) & 0xFF)      # Hour
-        _minute = (tempVals[2] & 0xFF)           # Minute
-        _second = ((tempVals[2] >> 8) & 0xFF)    # Second
-        _millisecond = tempVals[3]               # Millisecond
-
-        deviceModel.setDeviceData("Chiptime",
-                                  f"{_year}-{_month:02}-{_day:02} {_hour:02}:{_minute:02}:{_second:02}.{_millisecond}")  # Set chip time
+        _year, _month, _day, _hour, _minute, _second, _millisecond = _CHIPTIME.unpack_from(datahex, 2)
+        deviceModel.sample.chipTime = (2000 + _year, _month, _day, _hour, _minute, _second, _millisecond)
 
     def readReg(self, regAddr, regCount, deviceModel):
         """
@@ -0,0 +1,129 @@
+# coding: UTF-8
+import time
+import threading
+from bisect import bisect_right
+import numpy as np
+from lib.frame_recorder import LOG_HEADER, readLog
+
+"""
+    Replay Port
+"""
+
+class ReplayPort:
+    """
+    Serial port stand-in that streams a captured byte log
+    Accepts a FrameRecorder log (paced by the recorded host times) or a raw byte
+    capture of any device (paced by the baud rate, 10 bits per byte). speed scales
+    the pacing; speed 0 streams as fast as the reader consumes it.
+    Implements the part of serial.Serial that DeviceModel and the resolvers use.
+    """
+
+    # Largest chunk handed out per read in as-fast-as-possible mode
+    FastChunkSize = 4096
+
+    def __init__(self, fileName, speed=1.0, baud=115200, timeout=0.5):
+        """
+        :param fileName: FrameRecorder log or raw byte capture
+        :param speed: Playback speed factor, 0 for as fast as possible
+        :param baud: Baud rate used to pace a raw capture
+        :param timeout: Read timeout in seconds, None blocks until data or end of log
+        """
+        self.fileName = fileName
+        self.speed = speed
+        self.baudrate = baud
+        self.timeout = timeout
+        self.is_open = True
+        self.position = 0                               # Bytes handed out so far
+        self.bytesWritten = 0                           # Bytes written by the host (discarded)
+        self.finished = threading.Event()               # Set once the whole log has been read
+        with open(fileName, "rb") as f:
+            isFrameLog = f.read(len(LOG_HEADER)) == LOG_HEADER
+        if isFrameLog:
+            records = readLog(fileName)
+            self.data = records["frame"].tobytes()
+            # Every group of records with the same host time was one serial chunk
+            if len(records) > 0:
+                hostTimes = np.asarray(records["hostTime"])
+                ends = np.flatnonzero(np.diff(hostTimes)) + 1
+                ends = np.append(ends, len(records))
+                self.chunkEnds = (ends * records["frame"].shape[1]).tolist()
+                self.chunkTimes = (hostTimes[ends - 1] - hostTimes[0]).tolist()
+            else:
+                self.chunkEnds, self.chunkTimes = [], []
+            self.byteRate = None
+        else:
+            with open(fileName, "rb") as f:
+                self.data = f.read()
+            self.byteRate = baud / 10.0
+        self.startTime = time.monotonic()
+
+    def _due(self, now):
+        """
+        Number of bytes the device would have sent by now
+        """
+        if self.speed <= 0:
+            return len(self.data)
+        elapsed = (now - self.startTime) * self.speed
+        if self.byteRate is not None:
+            return min(len(self.data), int(elapsed * self.byteRate))
+        index = bisect_right(self.chunkTimes, elapsed)
+        return self.chunkEnds[index - 1] if index > 0 else 0
+
+    def _nextDueTime(self):
+        """
+        Host time at which the next byte becomes due
+        """
+        if self.byteRate is not None:
+            return self.startTime + (self.position + 1) / self.byteRate / self.speed
+        index = bisect_right(self.chunkEnds, self.position)
+        return self.startTime + self.chunkTimes[index] / self.speed
+
+    @property
+    def in_waiting(self):
+        due = self._due(time.monotonic()) - self.position
+        if self.speed <= 0:
+            return min(due, self.FastChunkSize)
+        return due
+
+    def inWaiting(self):
+        return self.in_waiting
+
+    def read(self, size=1):
+        """
+        Read up to size bytes, waiting until some are due or the timeout expires
+        :param size: Maximum number of bytes
+        :return: bytes, empty on timeout or at the end of the log
+        """
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while self.is_open:
+            now = time.monotonic()
+            due = self._due(now)
+            if due > self.position:
+                tEnd = min(due, self.position + size)
+                data = self.data[self.position:tEnd]
+                self.position = tEnd
+                return data
+            if self.position >= len(self.data):
+                self.finished.set()
+                if deadline is not None:
+                    time.sleep(max(0.0, deadline - now))
+                else:
+                    time.sleep(0.1)
+                return b""
+            wakeTime = self._nextDueTime()
+            if deadline is not None:
+                if now >= deadline:
+                    return b""
+                wakeTime = min(wakeTime, deadline)
+            time.sleep(max(0.0, wakeTime - now))
+        return b""
+
+    def write(self, data):
+        self.bytesWritten += len(data)
+        return len(data)
+
+    def isOpen(self):
+        return self.is_open
+
+    def close(self):
+        self.is_open = False
@@ -3,18 +3,16 @@
     Test file
 """
 import time
-import datetime
 import platform
-import struct
 import lib.device_model as deviceModel
 from lib.data_processor.roles.jy901s_dataProcessor import JY901SDataProcessor
 from lib.protocol_resolver.roles.wit_protocol_resolver import WitProtocolResolver
+from lib.frame_recorder import FrameRecorder
 
 welcome = """
 Welcome to the Wit-Motion sample program
 """
-_writeF = None                    # File for writing data
-_IsWriteF = False                 # Flag indicating whether to write data
+_recorder = None                  # Binary recorder of the raw packets
 
 def readConfig(device):
     """
@@ -75,62 +73,43 @@ def onUpdate(deviceModel):
     :param deviceModel: Device model
     :return:
     """
-    print("Chip Time:" + str(deviceModel.getDeviceData("Chiptime")),
-          " Temperature:" + str(deviceModel.getDeviceData("temperature")),
-          " Acceleration:" + str(deviceModel.getDeviceData("accX")) + "," + str(deviceModel.getDeviceData("accY")) + "," + str(deviceModel.getDeviceData("accZ")),
-          " Gyro:" + str(deviceModel.getDeviceData("gyroX")) + "," + str(deviceModel.getDeviceData("gyroY")) + "," + str(deviceModel.getDeviceData("gyroZ")),
-          " Angle:" + str(deviceModel.getDeviceData("angleX")) + "," + str(deviceModel.getDeviceData("angleY")) + "," + str(deviceModel.getDeviceData("angleZ")),
-          " Magnetic Field:" + str(deviceModel.getDeviceData("magX")) + "," + str(deviceModel.getDeviceData("magY")) + "," + str(deviceModel.getDeviceData("magZ")),
-          " Longitude:" + str(deviceModel.getDeviceData("lon")) + " Latitude:" + str(deviceModel.getDeviceData("lat")),
-          " Yaw:" + str(deviceModel.getDeviceData("Yaw")) + " Speed:" + str(deviceModel.getDeviceData("Speed")),
-          " Quaternion:" + str(deviceModel.getDeviceData("q1")) + "," + str(deviceModel.getDeviceData("q2")) + "," + str(deviceModel.getDeviceData("q3")) + "," + str(deviceModel.getDeviceData("q4"))
+    tVals = deviceModel.getSample().asDict(rounded=True)  # One consistent, rounded sample
+    print("Chip Time:" + str(tVals["chipTime"]),
+          " Temperature:" + str(tVals["temperature"]),
+          " Acceleration:" + str(tVals["accX"]) + "," + str(tVals["accY"]) + "," + str(tVals["accZ"]),
+          " Gyro:" + str(tVals["gyroX"]) + "," + str(tVals["gyroY"]) + "," + str(tVals["gyroZ"]),
+          " Angle:" + str(tVals["angleX"]) + "," + str(tVals["angleY"]) + "," + str(tVals["angleZ"]),
+          " Magnetic Field:" + str(tVals["magX"]) + "," + str(tVals["magY"]) + "," + str(tVals["magZ"]),
+          " Longitude:" + str(tVals["lon"]) + " Latitude:" + str(tVals["lat"]),
+          " Yaw:" + str(tVals["Yaw"]) + " Speed:" + str(tVals["Speed"]),
+          " Quaternion:" + str(tVals["q1"]) + "," + str(tVals["q2"]) + "," + str(tVals["q3"]) + "," + str(tVals["q4"])
           )
-    if _IsWriteF:  # Record data
-        Tempstr = " " + str(deviceModel.getDeviceData("Chiptime"))
-        Tempstr += "\t" + str(deviceModel.getDeviceData("accX")) + "\t" + str(deviceModel.getDeviceData("accY")) + "\t" + str(deviceModel.getDeviceData("accZ"))
-        Tempstr += "\t" + str(deviceModel.getDeviceData("gyroX")) + "\t" + str(deviceModel.getDeviceData("gyroY")) + "\t" + str(deviceModel.getDeviceData("gyroZ"))
-        Tempstr += "\t" + str(deviceModel.getDeviceData("angleX")) + "\t" + str(deviceModel.getDeviceData("angleY")) + "\t" + str(deviceModel.getDeviceData("angleZ"))
-        Tempstr += "\t" + str(deviceModel.getDeviceData("temperature"))
-        Tempstr += "\t" + str(deviceModel.getDeviceData("magX")) + "\t" + str(deviceModel.getDeviceData("magY")) + "\t" + str(deviceModel.getDeviceData("magZ"))
-        Tempstr += "\t" + str(deviceModel.getDeviceData("lon")) + "\t" + str(deviceModel.getDeviceData("lat"))
-        Tempstr += "\t" + str(deviceModel.getDeviceData("Yaw")) + "\t" + str(deviceModel.getDeviceData("Speed"))
-        Tempstr += "\t" + str(deviceModel.getDeviceData("q1")) + "\t" + str(deviceModel.getDeviceData("q2"))
-        Tempstr += "\t" + str(deviceModel.getDeviceData("q3")) + "\t" + str(deviceModel.getDeviceData("q4"))
-        Tempstr += "\r\n"
-        _writeF.write(Tempstr)
 
-def startRecord():
+def startRecord(device):
     """
     Start recording data
+    Raw packets are written as binary records by a background thread; read a log
+    back with lib.frame_recorder.readLog.
+    :param device: Device model
     :return:
     """
-    global _writeF
-    global _IsWriteF
-    _writeF = open(str(datetime.datetime.now().strftime('%Y%m%d%H%M%S')) + ".txt", "w")  # Create a new file
-    _IsWriteF = True  # Enable writing flag
-    Tempstr = "Chiptime"
-    Tempstr += "\tax(g)\tay(g)\taz(g)"
-    Tempstr += "\twx(deg/s)\twy(deg/s)\twz(deg/s)"
-    Tempstr += "\tAngleX(deg)\tAngleY(deg)\tAngleZ(deg)"
-    Tempstr += "\tT(°)"
-    Tempstr += "\tmagx\tmagy\tmagz"
-    Tempstr += "\tlon\tlat"
-    Tempstr += "\tYaw\tSpeed"
-    Tempstr += "\tq1\tq2\tq3\tq4"
-    Tempstr += "\r\n"
-    _writeF.write(Tempstr)
+    global _recorder
+    _recorder = FrameRecorder()
+    _recorder.start()
+    device.protocolResolver.Recorder = _recorder  # Hand every valid packet to the recorder
     print("Started recording data")
 
-def endRecord():
+def endRecord(device):
     """
     End recording data
+    :param device: Device model
     :return:
     """
-    global _writeF
-    global _IsWriteF
-    _IsWriteF = False             # Disable writing flag
-    _writeF.close()               # Close file
-    print("Data recording ended")
+    global _recorder
+    device.protocolResolver.Recorder = None
+    _recorder.stop()              # Write out queued packets and close the file
+    print(f"Data recording ended, {_recorder.recordCount} packets written")
+    _recorder = None
 
 if __name__ == '__main__':
 
@@ -154,7 +133,7 @@ if __name__ == '__main__':
     readConfig(device)                                  # Read configuration information
     device.dataProcessor.onVarChanged.append(onUpdate)  # Register data update event
 
-    startRecord()                                       # Start recording data
+    startRecord(device)                                 # Start recording data
     input()
     device.closeDevice()
-    endRecord()                                         # End data recording
+    endRecord(device)                                   # End data recording
@@ -0,0 +1,40 @@
+# coding: UTF-8
+"""
+    Replay a captured byte log through the device model
+    Usage: python replay.py <log file> [speed]
+    speed 1 replays in real time, N replays N times faster and 0 as fast as
+    possible, which reports the decode throughput.
+"""
+import sys
+import time
+import lib.device_model as deviceModel
+from lib.data_processor.roles.jy901s_dataProcessor import JY901SDataProcessor
+from lib.protocol_resolver.roles.wit_protocol_resolver import WitProtocolResolver
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    resolver = WitProtocolResolver(bulkDecode=True)
+    device = deviceModel.DeviceModel(
+        "replay",
+        resolver,
+        JY901SDataProcessor(),
+        "51_0"
+    )
+    device.serialConfig.replayFile = sys.argv[1]
+    device.serialConfig.replaySpeed = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    device.serialConfig.baud = 115200
+
+    start = time.perf_counter()
+    device.openDevice()
+    if device.serialPort is None:
+        sys.exit(1)
+    try:
+        while not device.serialPort.finished.wait(1.0):
+            print(f"{resolver.PacketCount} packets, {device.serialPort.position} bytes")
+    except KeyboardInterrupt:
+        print("Replay stopped by user.")
+    elapsed = time.perf_counter() - start
+    device.closeDevice()
+    print(f"Decoded {resolver.PacketCount} packets in {elapsed:.2f} s: {resolver.PacketCount / elapsed:.0f} packets/s")
@@ -35,15 +35,16 @@ def onUpdate(deviceModel):
     :param deviceModel: Device model
     :return:
     """
-    print("Chip Time:" + str(deviceModel.getDeviceData("Chiptime")),
-          " Temperature:" + str(deviceModel.getDeviceData("temperature")),
-          " Acceleration:" + str(deviceModel.getDeviceData("accX")) + "," + str(deviceModel.getDeviceData("accY")) + "," + str(deviceModel.getDeviceData("accZ")),
-          " Gyro:" + str(deviceModel.getDeviceData("gyroX")) + "," + str(deviceModel.getDeviceData("gyroY")) + "," + str(deviceModel.getDeviceData("gyroZ")),
-          " Angle:" + str(deviceModel.getDeviceData("angleX")) + "," + str(deviceModel.getDeviceData("angleY")) + "," + str(deviceModel.getDeviceData("angleZ")),
-          " Magnetic Field:" + str(deviceModel.getDeviceData("magX")) + "," + str(deviceModel.getDeviceData("magY")) + "," + str(deviceModel.getDeviceData("magZ")),
-          " Longitude:" + str(deviceModel.getDeviceData("lon")) + " Latitude:" + str(deviceModel.getDeviceData("lat")),
-          " Yaw:" + str(deviceModel.getDeviceData("Yaw")) + " Speed:" + str(deviceModel.getDeviceData("Speed")),
-          " Quaternion:" + str(deviceModel.getDeviceData("q1")) + "," + str(deviceModel.getDeviceData("q2")) + "," + str(deviceModel.getDeviceData("q3")) + "," + str(deviceModel.getDeviceData("q4"))
+    tVals = deviceModel.getSample().asDict(rounded=True)  # One consistent, rounded sample
+    print("Chip Time:" + str(tVals["chipTime"]),
+          " Temperature:" + str(tVals["temperature"]),
+          " Acceleration:" + str(tVals["accX"]) + "," + str(tVals["accY"]) + "," + str(tVals["accZ"]),
+          " Gyro:" + str(tVals["gyroX"]) + "," + str(tVals["gyroY"]) + "," + str(tVals["gyroZ"]),
+          " Angle:" + str(tVals["angleX"]) + "," + str(tVals["angleY"]) + "," + str(tVals["angleZ"]),
+          " Magnetic Field:" + str(tVals["magX"]) + "," + str(tVals["magY"]) + "," + str(tVals["magZ"]),
+          " Longitude:" + str(tVals["lon"]) + " Latitude:" + str(tVals["lat"]),
+          " Yaw:" + str(tVals["Yaw"]) + " Speed:" + str(tVals["Speed"]),
+          " Quaternion:" + str(tVals["q1"]) + "," + str(tVals["q2"]) + "," + str(tVals["q3"]) + "," + str(tVals["q4"])
           )
 
 if __name__ == '__main__':
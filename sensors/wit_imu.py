@@ -0,0 +1,24 @@
+# sensors/wit_imu.py
+
+import os
+import sys
+
+# The WIT library imports itself as 'lib', so its directory has to be on the path
+WIT_LIB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mag-WIT-9010-R232')
+
+def open_wit_imu(port, baud_rate, on_sample, read_thread=True):
+    # Opens the WIT IMU and calls on_sample(sample) with every published ImuSample.
+    # Returns the device model; call closeDevice() on it to stop the reader. With
+    # read_thread=False the caller runs device.readDataTh(name, 10) itself.
+    if WIT_LIB_DIR not in sys.path:
+        sys.path.insert(0, WIT_LIB_DIR)
+    import lib.device_model as device_model
+    from lib.data_processor.roles.jy901s_dataProcessor import JY901SDataProcessor
+    from lib.protocol_resolver.roles.wit_protocol_resolver import WitProtocolResolver
+
+    device = device_model.DeviceModel("imu", WitProtocolResolver(), JY901SDataProcessor(), "51_0")
+    device.serialConfig.portName = port
+    device.serialConfig.baud = baud_rate
+    device.dataProcessor.onVarChanged.append(lambda model: on_sample(model.getSample()))
+    device.openDevice(read_thread)
+    return device